@@ -0,0 +1,194 @@
+# Declarative sheet layouts for each broker tab, and the report of rows that failed to load
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import re
+from ..config import settings
+
+@dataclass(frozen=True)
+class Column:
+    """One sheet column mapped onto a Position field (or, for write-back, a computed property)"""
+    field: str
+    index: int
+    type: str = "text"  # "text" or "number"
+    required: bool = True
+
+@dataclass(frozen=True)
+class BrokerSchema:
+    """Where a broker's positions live in the sheet and how their columns map onto Position"""
+    broker: str  # BrokerSheet value
+    default_range: str
+    columns: Tuple[Column, ...]
+    range_setting: Optional[str] = None  # Settings field that overrides default_range
+    writeback: Tuple[Column, ...] = ()  # Computed Position values written back to each row
+    writeback_setting: Optional[str] = None  # Settings field that moves the write-back columns
+
+    @property
+    def width(self) -> int:
+        """Columns a row needs to hold every required field"""
+        return max(column.index for column in self.columns if column.required) + 1
+
+    @property
+    def required_fields(self) -> Tuple[str, ...]:
+        return tuple(column.field for column in self.columns if column.required)
+
+    def range_name(self) -> str:
+        if self.range_setting:
+            return getattr(settings, self.range_setting, None) or self.default_range
+        return self.default_range
+
+    def first_row(self) -> int:
+        """Sheet row number of the range's first row (e.g. 2 for "Webull!A2:C")"""
+        match = re.search(r"![A-Z]+(\d+)", self.range_name())
+        return int(match.group(1)) if match else 1
+
+    def read_columns(self) -> Optional[Tuple[int, int]]:
+        """First and last column index the read range covers, or None when it spans every column"""
+        match = re.fullmatch(r"\$?([A-Z]+)\$?\d*:\$?([A-Z]+)\$?\d*", self.range_name().rsplit("!", 1)[-1])
+        if not match:
+            return None
+        return column_index(match.group(1)), column_index(match.group(2))
+
+    def writeback_columns(self) -> Tuple[Column, ...]:
+        """Write-back columns, moved by the settings override (comma-separated letters, empty to disable).
+
+        Raises ValueError when a column falls inside the read range, since
+        every write would then change the range and force a reload.
+        """
+        columns = self.writeback
+        override = getattr(settings, self.writeback_setting, None) if self.writeback_setting else None
+        if override is not None:
+            letters = [letter.strip().upper() for letter in override.split(",") if letter.strip()]
+            if letters and len(letters) != len(self.writeback):
+                raise ValueError(f"{self.writeback_setting} needs {len(self.writeback)} columns "
+                                 f"({', '.join(column.field for column in self.writeback)}), got {override!r}")
+            columns = tuple(Column(column.field, column_index(letter), column.type)
+                            for column, letter in zip(self.writeback, letters))
+
+        read = self.read_columns()
+        for column in columns:
+            if read is None or read[0] <= column.index <= read[1]:
+                raise ValueError(f"{self.broker} write-back column {column_letter(column.index)} ({column.field}) "
+                                 f"is inside the read range {self.range_name()}")
+        return columns
+
+    def tab_name(self) -> str:
+        """Sheet tab the range lives on (e.g. "Webull" for "Webull!A2:C")"""
+        return self.range_name().rsplit("!", 1)[0]
+
+    def cell(self, column: Column, row: int) -> str:
+        """A1 reference of a column in a given sheet row"""
+        return f"{self.tab_name()}!{column_letter(column.index)}{row}"
+
+def column_index(letters: str) -> int:
+    """Zero-based column index for a sheet column letter (A -> 0, AA -> 26)"""
+    if not re.fullmatch(r"[A-Z]+", letters):
+        raise ValueError(f"Invalid column letter: {letters!r}")
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+def column_letter(index: int) -> str:
+    """Sheet column letter for a zero-based column index (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+# Adding a broker is a BrokerSheet member plus a schema here
+BROKER_SCHEMAS: Dict[str, BrokerSchema] = {}
+
+def register_schema(schema: BrokerSchema):
+    BROKER_SCHEMAS[schema.broker] = schema
+
+def get_schema(broker: str) -> BrokerSchema:
+    try:
+        return BROKER_SCHEMAS[broker]
+    except KeyError:
+        raise ValueError(f"No sheet schema registered for broker {broker}") from None
+
+register_schema(BrokerSchema(
+    broker="Fidelity",
+    default_range="Fidelity!A2:D",
+    range_setting="fidelity_range",
+    writeback_setting="fidelity_writeback_columns",
+    columns=(
+        Column("account_type", 0),
+        Column("symbol", 1),
+        Column("quantity", 2, "number"),
+        Column("cost_basis", 3, "number"),
+    ),
+    writeback=(
+        Column("market_value", 4, "number"),
+        Column("gain_loss", 5, "number"),
+    ),
+))
+
+register_schema(BrokerSchema(
+    broker="Webull",
+    default_range="Webull!A2:C",
+    range_setting="webull_range",
+    writeback_setting="webull_writeback_columns",
+    columns=(
+        Column("symbol", 0),
+        Column("quantity", 1, "number"),
+        Column("cost_basis", 2, "number"),
+    ),
+    writeback=(
+        Column("market_value", 3, "number"),
+        Column("gain_loss", 4, "number"),
+    ),
+))
+
+register_schema(BrokerSchema(
+    broker="Kraken",
+    default_range="Kraken!A2:C",
+    range_setting="kraken_range",
+    writeback_setting="kraken_writeback_columns",
+    columns=(
+        Column("symbol", 0),
+        Column("quantity", 1, "number"),
+        Column("cost_basis", 2, "number"),
+    ),
+    writeback=(
+        Column("market_value", 3, "number"),
+        Column("gain_loss", 4, "number"),
+    ),
+))
+
+def parse_number(value) -> float:
+    """Parse a sheet number, allowing formatted values like "$1,234.50" or "(12.00)" """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().replace(",", "").replace("$", "")
+    if text.startswith("(") and text.endswith(")"):
+        text = "-" + text[1:-1]
+    return float(text)
+
+@dataclass
+class RowError:
+    broker: str
+    row: int  # Sheet row number
+    values: List
+    error: str
+
+    def to_dict(self) -> Dict:
+        return {"broker": self.broker, "row": self.row, "values": self.values, "error": self.error}
+
+@dataclass
+class LoadReport:
+    """Outcome of loading one broker's range: how many rows became positions and which were rejected"""
+    broker: str
+    rows: int = 0
+    loaded: int = 0
+    errors: List[RowError] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "broker": self.broker,
+            "rows": self.rows,
+            "loaded": self.loaded,
+            "errors": [error.to_dict() for error in self.errors],
+        }
@@ -0,0 +1,112 @@
+# Vectorized portfolio value history and return calculations
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+SECONDS_PER_YEAR = 365.25 * 86400
+
+def holdings_matrix(positions, symbols: Sequence[str], brokers: Sequence[str]) -> np.ndarray:
+    """Quantity held per (broker, symbol), shape (brokers, symbols)"""
+    symbol_index = {symbol: i for i, symbol in enumerate(symbols)}
+    broker_index = {broker: i for i, broker in enumerate(brokers)}
+    holdings = np.zeros((len(brokers), len(symbols)))
+    rows = [broker_index[p.broker.value] for p in positions]
+    cols = [symbol_index[p.symbol] for p in positions]
+    np.add.at(holdings, (rows, cols), [p.quantity for p in positions])
+    return holdings
+
+def daily_returns(closes: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+    """Period returns of the held basket, shape (T - 1,).
+
+    Each period only uses symbols priced at both ends, so a symbol whose
+    history starts mid-window doesn't show up as a jump in value.
+    """
+    previous, current = closes[:-1], closes[1:]
+    both = ~np.isnan(previous) & ~np.isnan(current)
+    start_value = np.where(both, previous, 0.0) @ quantities
+    end_value = np.where(both, current, 0.0) @ quantities
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(start_value > 0, end_value / start_value - 1.0, 0.0)
+    return returns
+
+def time_weighted_return(returns: np.ndarray) -> float:
+    """Chain period returns geometrically"""
+    return float(np.prod(1.0 + returns) - 1.0)
+
+def money_weighted_return(years: np.ndarray, cash_flows: np.ndarray,
+                          guess: float = 0.1, tolerance: float = 1e-10, max_iterations: int = 100) -> Optional[float]:
+    """Annualized internal rate of return of cash flows at the given times (in years).
+
+    Cash flows follow the investor's view: money put in is negative, money
+    taken out (including the ending value) is positive. Solved with Newton's
+    method; None when it doesn't converge.
+    """
+    rate = guess
+    for _ in range(max_iterations):
+        discount = (1.0 + rate) ** -years
+        npv = np.sum(cash_flows * discount)
+        slope = np.sum(-years * cash_flows * discount / (1.0 + rate))
+        if slope == 0:
+            return None
+        step = npv / slope
+        rate -= step
+        if rate <= -1.0:
+            rate = -0.999999
+        if abs(step) < tolerance:
+            return float(rate)
+    return None
+
+def portfolio_performance(positions, symbols: List[str], brokers: Sequence[str],
+                          timestamps: np.ndarray, closes: np.ndarray,
+                          flows: Optional[np.ndarray] = None) -> Dict:
+    """Value series and returns for positions priced by a (T, symbols) close matrix.
+
+    Holdings are taken as constant over the window (the sheet records current
+    quantities, not trades). `flows` optionally gives external deposits
+    (positive) or withdrawals (negative) per timestamp for the money-weighted
+    return, on top of the starting value and symbols whose history begins
+    mid-window.
+    """
+    holdings = holdings_matrix(positions, symbols, brokers)
+    quantities = holdings.sum(axis=0)
+    prices = np.nan_to_num(closes, nan=0.0)
+
+    symbol_values = prices * quantities
+    broker_values = prices @ holdings.T
+    total = symbol_values.sum(axis=1)
+
+    # The window starts once anything in the portfolio has a price
+    priced = np.flatnonzero(total > 0)
+    result = {
+        "timestamps": timestamps.astype("M8[s]").astype("int64").tolist(),
+        "total": total.tolist(),
+        "by_broker": {broker: broker_values[:, i].tolist() for i, broker in enumerate(brokers)},
+        "by_symbol": {symbol: symbol_values[:, i].tolist() for i, symbol in enumerate(symbols)},
+        "twr": None,
+        "twr_annualized": None,
+        "mwr": None,
+    }
+    if len(priced) < 2:
+        return result
+
+    first, last = priced[0], priced[-1]
+    window = closes[first:last + 1]
+    returns = daily_returns(window, quantities)
+    twr = time_weighted_return(returns)
+    seconds = timestamps.astype("M8[s]").astype("int64").astype("f8")
+    years = (seconds[first:last + 1] - seconds[first]) / SECONDS_PER_YEAR
+    result["twr"] = twr
+    if years[-1] > 0 and twr > -1.0:
+        result["twr_annualized"] = float((1.0 + twr) ** (1.0 / years[-1]) - 1.0)
+
+    # A symbol whose history starts mid-window counts as money added at that point, as in the TWR
+    deposits = np.zeros(len(years))
+    deposits[1:] = np.where(np.isnan(window[:-1]) & ~np.isnan(window[1:]), window[1:], 0.0) @ quantities
+    if flows is not None:
+        deposits += flows[first:last + 1]
+
+    cash_flows = -deposits
+    cash_flows[0] -= total[first]
+    cash_flows[-1] += total[last]
+    if years[-1] > 0:
+        result["mwr"] = money_weighted_return(years, cash_flows)
+    return result
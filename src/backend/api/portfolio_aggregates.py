@@ -0,0 +1,125 @@
+# Incrementally maintained portfolio aggregates behind a versioned summary cache
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+class PortfolioAggregates:
+    """Running totals, broker buckets and per-symbol rollups for one position list.
+
+    Seeded from a full summary, then kept current by apply_prices: a price
+    change only adjusts the affected symbol's contribution to the totals, its
+    brokers' buckets and its rollup, and moves that one row within the sorted
+    positions list. The summary dict is cached per version, and the version
+    only moves when a price actually changes.
+    """
+
+    def __init__(self, positions: List, seed: Dict, version: int = 0):
+        self.positions = positions
+        self.position_count = len(positions)
+        self.version = version
+        self.updates_since_rebuild = 0
+        self.updated_at = datetime.now()
+
+        self._by_symbol: Dict[str, List] = {}
+        self._first_seen: Dict[str, int] = {}
+        for position in positions:
+            if position.symbol not in self._by_symbol:
+                self._first_seen[position.symbol] = len(self._first_seen)
+                self._by_symbol[position.symbol] = []
+            self._by_symbol[position.symbol].append(position)
+
+        self.total_value = seed["total_value"]
+        self.total_cost = seed["total_cost"]
+        self.total_gain_loss = seed["total_gain_loss"]
+        self.brokers = {broker: dict(data) for broker, data in seed["by_broker"].items()}
+        self.symbols = {row["symbol"]: dict(row) for row in seed["positions"]}
+
+        # Sorted by market value (largest first), then first-seen order, like a stable sort
+        self._order: List[Tuple[float, int, str]] = sorted(
+            self._sort_key(symbol) + (symbol,) for symbol in self.symbols
+        )
+
+        self._summary: Optional[Dict] = None
+        self._summary_version = -1
+
+    def _sort_key(self, symbol: str) -> Tuple[float, int]:
+        return (-self.symbols[symbol]["market_value"], self._first_seen[symbol])
+
+    def is_current(self, positions: List) -> bool:
+        """Whether these aggregates still describe the given position list"""
+        return positions is self.positions and len(positions) == self.position_count
+
+    def symbol_positions(self, symbol: str) -> List:
+        return self._by_symbol.get(symbol, [])
+
+    def apply_prices(self, prices: Dict[str, float]) -> Set[str]:
+        """Apply new prices to positions and aggregates, returning the symbols that changed"""
+        changed = set()
+        for symbol, price in prices.items():
+            positions = self._by_symbol.get(symbol)
+            if not positions or all(p.current_value == price for p in positions):
+                continue
+            self._apply_symbol_price(symbol, positions, price)
+            changed.add(symbol)
+
+        if changed:
+            self.version += 1
+            self.updates_since_rebuild += len(changed)
+            self.updated_at = datetime.now()
+        return changed
+
+    def _apply_symbol_price(self, symbol: str, positions: List, price: Optional[float]):
+        rollup = self.symbols[symbol]
+        old_key = self._sort_key(symbol) + (symbol,)
+
+        for position in positions:
+            cost = position.quantity * position.cost_basis
+            old_value = position.market_value
+            position.current_value = price
+            new_value = position.market_value
+
+            old_gain = old_value - cost if old_value is not None else 0
+            new_gain = new_value - cost if new_value is not None else 0
+            self.total_value += (new_value or 0) - (old_value or 0)
+            self.total_gain_loss += new_gain - old_gain
+
+            # Broker buckets only count positions with a non-zero market value
+            bucket = self.brokers[position.broker.value]
+            bucket["total_value"] += (new_value if new_value else 0) - (old_value if old_value else 0)
+            bucket["gain_loss"] += (new_gain if new_value else 0) - (old_gain if old_value else 0)
+
+            rollup["market_value"] += (new_value or 0) - (old_value or 0)
+
+        rollup["current_price"] = price
+        rollup["gain_loss"] = rollup["market_value"] - rollup["total_cost"]
+
+        # Patch the sorted list: move just this symbol's row
+        del self._order[bisect_left(self._order, old_key)]
+        insort(self._order, self._sort_key(symbol) + (symbol,))
+
+    def summary(self) -> Dict:
+        """Summary dict for the current version; treat it as read-only"""
+        if self._summary_version != self.version:
+            self._summary = {
+                "total_value": self.total_value,
+                "total_cost": self.total_cost,
+                "total_gain_loss": self.total_gain_loss,
+                "by_broker": {broker: dict(data) for broker, data in self.brokers.items()},
+                "positions": [dict(self.symbols[symbol]) for *_, symbol in self._order],
+                "last_updated": self.updated_at.isoformat(),
+            }
+            self._summary_version = self.version
+        return self._summary
+
+    def delta(self, symbols: Set[str]) -> Dict:
+        """Rollups for the given symbols, the buckets of the brokers holding them, and the new totals"""
+        brokers = {position.broker.value for symbol in symbols for position in self._by_symbol.get(symbol, [])}
+        return {
+            "version": self.version,
+            "positions": {symbol: dict(self.symbols[symbol]) for symbol in symbols if symbol in self.symbols},
+            "by_broker": {broker: dict(self.brokers[broker]) for broker in brokers},
+            "total_value": self.total_value,
+            "total_cost": self.total_cost,
+            "total_gain_loss": self.total_gain_loss,
+            "last_updated": self.updated_at.isoformat(),
+        }
@@ -0,0 +1,90 @@
+# Portfolios (sheet ids) served from one process, sharing one market data service
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+import asyncio
+import logging
+from ..config import settings
+from ..utils.async_market_data import AsyncMarketDataService
+from ..utils.single_flight import SingleFlight
+from .portfolio_tracker import PortfolioTracker
+from .price_refresher import PriceRefresher
+
+logger = logging.getLogger(__name__)
+
+class PortfolioNotAllowed(Exception):
+    """Raised when a sheet id is not one this server is configured to serve"""
+
+class PortfolioRegistry:
+    """A tracker and price refresher per sheet id, least recently used closed first.
+
+    Every tracker is built on the same AsyncMarketDataService, so the quote
+    cache, rate limiter and provider health are shared: a ticker held by many
+    portfolios is fetched once per cache period, however many refreshers ask.
+    Opening a portfolio reads its sheet, so concurrent first requests for the
+    same sheet id share one load.
+    """
+
+    def __init__(self, market_data: AsyncMarketDataService, max_portfolios: Optional[int] = None,
+                 allowed_sheet_ids: Optional[Iterable[str]] = None):
+        self.market_data = market_data
+        self.max_portfolios = max(1, max_portfolios if max_portfolios is not None else settings.max_portfolios)
+        allowed = allowed_sheet_ids if allowed_sheet_ids is not None else settings.allowed_sheet_ids
+        self.allowed_sheet_ids = {settings.sheet_id, *allowed}
+        self._refreshers: "OrderedDict[str, PriceRefresher]" = OrderedDict()
+        self._flights = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._refreshers)
+
+    def __contains__(self, sheet_id: str) -> bool:
+        return sheet_id in self._refreshers
+
+    def sheet_ids(self) -> List[str]:
+        """Open portfolios, least recently used first"""
+        return list(self._refreshers)
+
+    async def get(self, sheet_id: Optional[str] = None) -> PriceRefresher:
+        """The refresher for a portfolio (the default sheet when None), opening it on first use"""
+        sheet_id = sheet_id or settings.sheet_id
+        if sheet_id not in self.allowed_sheet_ids:
+            raise PortfolioNotAllowed(f"Portfolio {sheet_id} is not served here")
+
+        refresher = self._refreshers.get(sheet_id)
+        if refresher is not None:
+            self._refreshers.move_to_end(sheet_id)
+            return refresher
+        return await self._flights.do(sheet_id, lambda: self._open(sheet_id))
+
+    async def _open(self, sheet_id: str) -> PriceRefresher:
+        # Loading the sheet is blocking network I/O, so keep it off the event loop
+        tracker = await asyncio.to_thread(PortfolioTracker, self.market_data, sheet_id)
+        refresher = PriceRefresher(tracker)
+        if settings.background_refresh:
+            refresher.start()
+        self._refreshers[sheet_id] = refresher
+        logger.info("Opened portfolio %s", sheet_id,
+                    extra={"event": "portfolio_opened", "sheet_id": sheet_id, "portfolios": len(self._refreshers)})
+
+        while len(self._refreshers) > self.max_portfolios:
+            await self._evict(keep=sheet_id)
+        return refresher
+
+    async def _evict(self, keep: str):
+        # Prefer portfolios nobody is streaming; otherwise close the least recently used anyway.
+        # `keep` is the portfolio being opened, which hasn't had a chance to get subscribers yet.
+        candidates = [sheet_id for sheet_id in self._refreshers if sheet_id != keep]
+        idle = next((sheet_id for sheet_id in candidates if len(self._refreshers[sheet_id].updates) == 0),
+                    candidates[0])
+        refresher = self._refreshers.pop(idle)
+        # End its streams so clients reconnect (and reopen it) rather than idle on a dead refresher
+        refresher.updates.close()
+        await refresher.stop()
+        logger.info("Closed portfolio %s", idle, extra={"event": "portfolio_closed", "sheet_id": idle})
+
+    async def close(self):
+        """Stop every open portfolio's background refresh"""
+        refreshers = list(self._refreshers.values())
+        self._refreshers.clear()
+        for refresher in refreshers:
+            refresher.updates.close()
+            await refresher.stop()
@@ -1,11 +1,23 @@
 # Tracks all of the portfolio data
 from enum import Enum
-from dataclasses import dataclass
-from typing import Optional, List, Dict
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Sequence, Set, Tuple, TYPE_CHECKING
 from datetime import datetime
+import hashlib
+import json
+import logging
 from ..utils.google_auth import GoogleSheetsClient
 from ..config import settings
 from ..utils.market_data import MarketDataService
+from ..utils.async_market_data import AsyncMarketDataService
+from .broker_schema import LoadReport, RowError, get_schema, parse_number
+from .portfolio_aggregates import PortfolioAggregates
+from .summary_payload import SummaryPayload, build_summary_payload
+
+if TYPE_CHECKING:
+    from .position_book import PositionBook
+
+logger = logging.getLogger(__name__)
 
 # Enum values for different broker sheets within the Google Sheet
 class BrokerSheet(Enum):
@@ -13,7 +25,7 @@ class BrokerSheet(Enum):
     WEBULL = "Webull"
     KRAKEN = "Kraken"
 
-@dataclass
+@dataclass(slots=True)
 class Position:
     broker: BrokerSheet
     symbol: str
@@ -22,24 +34,112 @@ class Position:
     account_type: Optional[str] = None
     current_value: Optional[float] = None
     last_updated: Optional[datetime] = None
+    row: Optional[int] = field(default=None, compare=False)  # Sheet row the position was loaded from
 
     def __post_init__(self):
         self._validate()
-        self.last_updated = datetime.now()
-    
+        if self.last_updated is None:
+            self.last_updated = datetime.now()
+
     def _validate(self):
-        if self.quantity <= 0:
+        self._check(self.broker, self.symbol, self.quantity, self.cost_basis, self.account_type)
+
+    @staticmethod
+    def _check(broker: BrokerSheet, symbol: str, quantity: float, cost_basis: float, account_type: Optional[str]):
+        if not quantity > 0:
             raise ValueError("Quantity must be positive")
         
-        if self.cost_basis < 0:
+        if not cost_basis >= 0:
             raise ValueError("Cost basis must be non-negative")
         
-        if not self.symbol:
+        if not symbol:
             raise ValueError("Symbol cannot be empty")
         
-        if self.broker == BrokerSheet.FIDELITY and not self.account_type:
-            raise ValueError("Account type is required for Fidelity broker")
-    
+        if not account_type and "account_type" in get_schema(broker.value).required_fields:
+            raise ValueError(f"Account type is required for {broker.value} broker")
+
+    @staticmethod
+    def row_width(broker: BrokerSheet) -> int:
+        """Number of sheet columns a position row needs for this broker"""
+        return get_schema(broker.value).width
+
+    @classmethod
+    def from_rows(cls, broker: BrokerSheet, rows: List[List], loaded_at: Optional[datetime] = None) -> List["Position"]:
+        """Build positions for one broker sheet in bulk, raising on the first invalid row.
+
+        Blank and short rows are skipped. See parse_rows for the tolerant variant.
+        """
+        return [position for position in cls.parse_rows(broker, rows, loaded_at) if position is not None]
+
+    @classmethod
+    def parse_rows(cls, broker: BrokerSheet, rows: List[List], loaded_at: Optional[datetime] = None,
+                   report: Optional[LoadReport] = None,
+                   row_numbers: Optional[Sequence[int]] = None) -> List[Optional["Position"]]:
+        """Convert a broker's sheet rows to positions in one pass, driven by its schema.
+
+        Returns one entry per row: the Position, or None for a blank, short or
+        invalid row. With a `report`, rejected rows are recorded there with
+        their sheet row number (from `row_numbers`, else counted from the
+        range's first row); without one, an invalid row raises ValueError.
+        Positions are validated like the constructor but skip the per-object
+        __init__ / __post_init__ calls and share one timestamp.
+        """
+        schema = get_schema(broker.value)
+        loaded_at = loaded_at or datetime.now()
+        width = schema.width
+        columns = [(column.field, column.index, column.type == "number", column.required) for column in schema.columns]
+        if row_numbers is None:
+            row_numbers = range(schema.first_row(), schema.first_row() + len(rows))
+        check = cls._check
+        new = object.__new__
+
+        parsed: List[Optional[Position]] = []
+        for row_number, row in zip(row_numbers, rows):
+            if not any(str(cell).strip() for cell in row):
+                parsed.append(None)
+                continue
+            try:
+                if len(row) < width:
+                    if report is None:
+                        # Short rows are skipped rather than fatal
+                        parsed.append(None)
+                        continue
+                    raise ValueError(f"Expected at least {width} columns, got {len(row)}")
+
+                values = {"account_type": None}
+                for name, index, numeric, required in columns:
+                    cell = row[index] if index < len(row) else ""
+                    if str(cell).strip() == "":
+                        if required:
+                            raise ValueError(f"Missing {name}")
+                        values[name] = None
+                    elif numeric:
+                        try:
+                            values[name] = parse_number(cell)
+                        except ValueError:
+                            raise ValueError(f"Invalid {name}: {cell!r}") from None
+                    else:
+                        values[name] = str(cell).strip()
+                check(broker, values["symbol"], values["quantity"], values["cost_basis"], values["account_type"])
+            except ValueError as e:
+                if report is None:
+                    raise
+                report.errors.append(RowError(broker.value, row_number, list(row), str(e)))
+                parsed.append(None)
+                continue
+
+            position = new(cls)
+            position.broker = broker
+            position.symbol = values["symbol"]
+            position.quantity = values["quantity"]
+            position.cost_basis = values["cost_basis"]
+            position.account_type = values["account_type"]
+            position.current_value = None
+            position.last_updated = loaded_at
+            position.row = row_number
+            parsed.append(position)
+        return parsed
+
     @property
     def market_value(self) -> Optional[float]:
         if self.current_value is not None:
@@ -52,71 +152,251 @@ class Position:
             return self.market_value - (self.quantity * self.cost_basis)
         return None
 
+def _fingerprint(rows: List[List]) -> str:
+    """Stable hash of a range's raw cell values"""
+    return hashlib.blake2b(json.dumps(rows, separators=(",", ":")).encode(), digest_size=16).hexdigest()
+
 class PortfolioTracker:
-    def __init__(self):
-        self.sheets_client = GoogleSheetsClient()
-        self.market_data = MarketDataService()
+    def __init__(self, async_market_data: Optional[AsyncMarketDataService] = None, sheet_id: Optional[str] = None):
+        self.sheets_client = GoogleSheetsClient(sheet_id)
+        self.sheet_id = self.sheets_client.sheet_id
+        # Market data can be shared with other consumers (e.g. the price endpoint, other portfolios) so they share one cache
+        self.async_market_data = async_market_data or AsyncMarketDataService(MarketDataService())
+        self.market_data = self.async_market_data.market_data
         self.positions: List[Position] = []
+        self._book: Optional["PositionBook"] = None
+        self._book_positions: Optional[List[Position]] = None
+        self._aggregates: Optional[PortfolioAggregates] = None
+        self._payload: Optional[SummaryPayload] = None
+        # Per broker: fingerprint of the last loaded range, its positions and their source rows
+        self._range_fingerprints: Dict[BrokerSheet, str] = {}
+        self._broker_positions: Dict[BrokerSheet, List[Position]] = {}
+        self._broker_rows: Dict[BrokerSheet, Dict[Tuple, List[Position]]] = {}
+        self._load_reports: Dict[BrokerSheet, LoadReport] = {}
         self.load_positions()
 
-    def load_positions(self):
-        self.positions = []
-        self._load_fidelity()
-        self._load_webull()
-        self._load_kraken()
-
-    def _load_fidelity(self):
-        data = self.sheets_client.read_range(settings.fidelity_range)
-        for row in data:
-            if len(row) >= 4:
-                self.positions.append(Position(
-                    broker=BrokerSheet.FIDELITY,
-                    account_type=row[0],
-                    symbol=row[1],
-                    quantity=float(row[2]),
-                    cost_basis=float(row[3])
-                ))
-
-    def _load_webull(self):
-        data = self.sheets_client.read_range(settings.webull_range)
-        for row in data:
-            if len(row) >= 3:
-                self.positions.append(Position(
-                    broker=BrokerSheet.WEBULL,
-                    symbol=row[0],
-                    quantity=float(row[1]),
-                    cost_basis=float(row[2])
-                ))
-
-    def _load_kraken(self):
-        data = self.sheets_client.read_range(settings.kraken_range)
-        for row in data:
-            if len(row) >= 3:
-                self.positions.append(Position(
-                    broker=BrokerSheet.KRAKEN,
-                    symbol=row[0],
-                    quantity=float(row[1]),
-                    cost_basis=float(row[2])
-                ))
+    def load_positions(self) -> bool:
+        """Reload positions from the sheet, returning whether anything changed.
+
+        Broker ranges whose raw values hash the same as last time are skipped
+        entirely. In a changed range only added or edited rows are parsed;
+        positions for untouched rows are kept along with their prices.
+        """
+        # Build the new list before swapping it in so readers never see a partial load
+        loaded_at = datetime.now()
+        broker_ranges = self._broker_ranges()
+        # One batchGet round trip covers every broker tab
+        data = self.sheets_client.read_ranges(list(broker_ranges.values()))
+
+        added = removed = 0
+        changed_brokers = []
+        for broker, range_name in broker_ranges.items():
+            rows = data.get(range_name, [])
+            fingerprint = _fingerprint(rows)
+            if self._range_fingerprints.get(broker) == fingerprint:
+                continue
+            broker_added, broker_removed = self._apply_rows(broker, rows, loaded_at)
+            self._range_fingerprints[broker] = fingerprint
+            added += broker_added
+            removed += broker_removed
+            changed_brokers.append(broker.value)
+
+        if not changed_brokers:
+            logger.info("Sheet unchanged; keeping %d positions", len(self.positions),
+                        extra={"event": "positions_unchanged", "positions": len(self.positions)})
+            return False
+
+        positions = []
+        for broker in broker_ranges:
+            positions.extend(self._broker_positions.get(broker, []))
+        self.positions = positions
+        logger.info("Loaded %d positions", len(self.positions),
+                    extra={"event": "positions_loaded", "positions": len(self.positions),
+                           "added": added, "removed": removed, "brokers": changed_brokers})
+        return True
+
+    def _apply_rows(self, broker: BrokerSheet, rows: List[List], loaded_at: datetime) -> Tuple[int, int]:
+        """Diff a broker's rows against the last load, returning (added, removed) position counts.
+
+        Rows that can't be loaded are recorded in the broker's load report
+        instead of failing the load.
+        """
+        schema = get_schema(broker.value)
+        width = schema.width
+        previous = {key: list(positions) for key, positions in self._broker_rows.get(broker, {}).items()}
+
+        keys = []
+        kept: List[Optional[Position]] = []
+        added_rows = []
+        added_row_numbers = []
+        for row_number, row in enumerate(rows, start=schema.first_row()):
+            # Only the parsed columns identify a row; notes in later columns don't matter
+            key = tuple(row[:width])
+            matches = previous.get(key)
+            keys.append(key)
+            if matches:
+                kept.append(matches.pop(0))
+            else:
+                kept.append(None)
+                added_rows.append(row)
+                added_row_numbers.append(row_number)
+
+        # Parse only the added or edited rows, in one bulk call
+        report = LoadReport(broker.value, rows=sum(1 for row in rows if any(str(cell).strip() for cell in row)))
+        new_positions = iter(Position.parse_rows(broker, added_rows, loaded_at, report, added_row_numbers))
+        prices = {p.symbol: p.current_value for p in self.positions if p.current_value is not None}
+
+        added = 0
+        positions = []
+        broker_rows: Dict[Tuple, List[Position]] = {}
+        for row_number, key, position in zip(range(schema.first_row(), schema.first_row() + len(rows)), keys, kept):
+            if position is None:
+                position = next(new_positions)
+                if position is None:
+                    continue
+                # Carry over the last known price so edited rows don't blank the summary
+                position.current_value = prices.get(position.symbol)
+                added += 1
+            else:
+                # Unchanged rows can still move when rows above them are inserted or removed
+                position.row = row_number
+            positions.append(position)
+            broker_rows.setdefault(key, []).append(position)
+
+        report.loaded = len(positions)
+        if report.errors:
+            logger.warning("Skipped %d invalid %s rows", len(report.errors), broker.value,
+                           extra={"event": "position_rows_rejected", "broker": broker.value,
+                                  "rows": [error.row for error in report.errors]})
+        self._load_reports[broker] = report
+        self._broker_positions[broker] = positions
+        self._broker_rows[broker] = broker_rows
+        return added, sum(len(unmatched) for unmatched in previous.values())
+
+    def _broker_ranges(self) -> Dict[BrokerSheet, str]:
+        """Sheet range holding each broker's positions, from the broker schemas"""
+        return {broker: get_schema(broker.value).range_name() for broker in BrokerSheet}
+
+    def load_report(self) -> List[Dict]:
+        """Per-broker outcome of the latest load, including rows that were rejected"""
+        return [self._load_reports[broker].to_dict() for broker in BrokerSheet if broker in self._load_reports]
 
     def update_prices(self):
         """Update current prices for all positions"""
         symbols = [p.symbol for p in self.positions]
         prices = self.market_data.get_multiple_prices(symbols)
-        
-        for position in self.positions:
-            position.current_value = prices.get(position.symbol)
-            position.last_updated = datetime.now()
+        self.apply_prices(prices)
+
+    async def update_prices_async(self):
+        """Update current prices for all positions without blocking the event loop"""
+        symbols = [p.symbol for p in self.positions]
+        prices = await self.async_market_data.get_multiple_prices(symbols)
+        self.apply_prices(prices)
+
+    def apply_prices(self, prices: Dict[str, float]) -> Set[str]:
+        """Apply fetched prices to the positions whose symbol was priced.
+
+        Only symbols whose price actually changed touch the summary
+        aggregates; the changed symbols are returned.
+        """
+        aggregates = self._get_aggregates()
+        changed = aggregates.apply_prices(prices)
+
+        now = datetime.now()
+        updated = 0
+        for symbol in prices:
+            for position in aggregates.symbol_positions(symbol):
+                position.last_updated = now
+                updated += 1
+        if changed and self._book is not None and self._book_positions is self.positions:
+            self._book.apply_prices({symbol: prices[symbol] for symbol in changed})
+        logger.debug("Applied %d prices to %d positions (%d changed)", len(prices), updated, len(changed))
+        return changed
+
+    @property
+    def summary_version(self) -> int:
+        """Version of the summary; only moves when positions or prices actually change"""
+        return self._get_aggregates().version
+
+    def _get_aggregates(self) -> PortfolioAggregates:
+        aggregates = self._aggregates
+        if (aggregates is None or not aggregates.is_current(self.positions)
+                or aggregates.updates_since_rebuild >= settings.summary_rebuild_interval):
+            # Full rebuild: new positions, or periodically to shed floating point drift
+            version = aggregates.version + 1 if aggregates is not None else 0
+            self._aggregates = PortfolioAggregates(self.positions, self._full_summary(), version=version)
+        return self._aggregates
+
+    def _position_book(self) -> Optional["PositionBook"]:
+        """Columnar copy of the positions, used for summaries on large portfolios"""
+        if not settings.columnar_positions or len(self.positions) < settings.columnar_min_positions:
+            return None
+        # Imported here so numpy only loads once a portfolio is large enough to need it
+        from .position_book import build_position_book
+        # Rebuild whenever the position list has been replaced
+        if self._book is None or self._book_positions is not self.positions or len(self._book) != len(self.positions):
+            self._book = build_position_book(self.positions, [broker.value for broker in BrokerSheet])
+            self._book_positions = self.positions
+        return self._book
 
     def get_summary(self) -> Dict:
-        """Get portfolio summary"""
+        """Get portfolio summary, cached until a position or price changes"""
+        return self._get_aggregates().summary()
+
+    def summary_delta(self, symbols: Set[str]) -> Dict:
+        """Incremental summary update covering just the given (changed) symbols"""
+        return self._get_aggregates().delta(symbols)
+
+    def get_performance(self, start: Optional[int] = None, end: Optional[int] = None,
+                        interval: str = "1d") -> Dict:
+        """Value series per portfolio, broker and symbol, plus time- and money-weighted returns.
+
+        Uses the stored close history, backfilling each symbol's newer bars first.
+        """
+        import numpy as np
+        from .performance import portfolio_performance
+
+        history = self.market_data.history
+        if history is None:
+            raise RuntimeError("Price history is not configured")
+
+        symbols = list(dict.fromkeys(p.symbol for p in self.positions))
+        priced_columns = [i for i, symbol in enumerate(symbols) if symbol.upper() != 'CASH']
+        priced = [symbols[i] for i in priced_columns]
+        for symbol in priced:
+            try:
+                self.market_data.backfill_history(symbol, interval)
+            except Exception as e:
+                # Chart what is already stored for this symbol
+                logger.warning("History backfill failed for %s: %s", symbol, e)
+
+        timestamps, priced_closes = history.aligned(
+            [self.market_data.format_symbol(symbol) for symbol in priced], start, end, interval)
+        # Cash has no history; it is always worth 1.0
+        closes = np.ones((len(timestamps), len(symbols)))
+        closes[:, priced_columns] = priced_closes
+        return portfolio_performance(self.positions, symbols, [broker.value for broker in BrokerSheet],
+                                     timestamps, closes)
+
+    def get_summary_payload(self) -> SummaryPayload:
+        """The summary as pre-serialized JSON, rebuilt only when the summary version moves"""
+        aggregates = self._get_aggregates()
+        if self._payload is None or self._payload.version != aggregates.version:
+            self._payload = build_summary_payload(aggregates.summary(), aggregates.version, settings.gzip_min_size)
+        return self._payload
+
+    def _full_summary(self) -> Dict:
+        """Compute the summary from scratch, vectorized for large portfolios"""
+        book = self._position_book()
+        if book is not None:
+            return book.summary()
+
         return {
             "total_value": sum(p.market_value or 0 for p in self.positions),
             "total_cost": sum(p.quantity * p.cost_basis for p in self.positions),
             "total_gain_loss": sum(p.gain_loss or 0 for p in self.positions),
             "by_broker": self._get_broker_summary(),
             "positions": self._get_positions_summary(),
-            "last_updated": datetime.now().isoformat()
         }
     
     def _get_positions_summary(self) -> List[Dict]:
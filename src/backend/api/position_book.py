@@ -0,0 +1,129 @@
+# Columnar, NumPy-backed position store for vectorized portfolio aggregation
+from typing import Dict, List, Optional, Sequence
+
+# Optional numpy import; the tracker falls back to per-position loops without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+class PositionBook:
+    """Positions stored as parallel arrays instead of a list of objects.
+
+    Quantity, cost basis and price are float arrays; broker and symbol are
+    integer codes into `brokers` / `symbols` (symbols in first-seen order).
+    Summaries are computed as vectorized reductions and bincount group-bys,
+    so aggregation stays flat as the number of positions grows.
+    """
+
+    def __init__(self, brokers: Sequence[str], symbols: List[str], broker_codes, symbol_codes,
+                 quantity, cost_basis, price):
+        self.brokers = list(brokers)
+        self.symbols = symbols
+        self.broker_codes = broker_codes
+        self.symbol_codes = symbol_codes
+        self.quantity = quantity
+        self.cost_basis = cost_basis
+        self.price = price  # NaN where a position has no price yet
+        self._symbol_index = {symbol: code for code, symbol in enumerate(symbols)}
+
+    @classmethod
+    def from_positions(cls, positions, brokers: Sequence[str]) -> "PositionBook":
+        broker_index = {broker: code for code, broker in enumerate(brokers)}
+        symbol_index: Dict[str, int] = {}
+        symbol_codes = np.empty(len(positions), dtype=np.int64)
+        for i, position in enumerate(positions):
+            symbol_codes[i] = symbol_index.setdefault(position.symbol, len(symbol_index))
+
+        return cls(
+            brokers=brokers,
+            symbols=list(symbol_index),
+            broker_codes=np.fromiter((broker_index[p.broker.value] for p in positions), dtype=np.int64, count=len(positions)),
+            symbol_codes=symbol_codes,
+            quantity=np.fromiter((p.quantity for p in positions), dtype=np.float64, count=len(positions)),
+            cost_basis=np.fromiter((p.cost_basis for p in positions), dtype=np.float64, count=len(positions)),
+            price=np.fromiter((np.nan if p.current_value is None else p.current_value for p in positions),
+                              dtype=np.float64, count=len(positions)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.quantity)
+
+    def apply_prices(self, prices: Dict[str, float]):
+        """Set the price of every position whose symbol appears in `prices`"""
+        codes = [(self._symbol_index[symbol], price) for symbol, price in prices.items() if symbol in self._symbol_index]
+        if not codes:
+            return
+        symbol_price = np.full(len(self.symbols), np.nan)
+        updated = np.zeros(len(self.symbols), dtype=bool)
+        for code, price in codes:
+            symbol_price[code] = np.nan if price is None else price
+            updated[code] = True
+
+        mask = updated[self.symbol_codes]
+        self.price[mask] = symbol_price[self.symbol_codes[mask]]
+
+    def summary(self) -> Dict:
+        """Totals, per-broker and per-symbol rollups, matching PortfolioTracker.get_summary"""
+        priced = ~np.isnan(self.price)
+        cost = self.quantity * self.cost_basis
+        market_value = np.where(priced, self.quantity * self.price, 0.0)
+        gain_loss = np.where(priced, market_value - cost, 0.0)
+
+        return {
+            "total_value": float(market_value.sum()),
+            "total_cost": float(cost.sum()),
+            "total_gain_loss": float(gain_loss.sum()),
+            "by_broker": self._broker_summary(cost, market_value, gain_loss),
+            "positions": self._positions_summary(cost, market_value),
+        }
+
+    def _broker_summary(self, cost, market_value, gain_loss) -> Dict:
+        n = len(self.brokers)
+        # Only positions with a non-zero market value count toward broker value and gain/loss
+        counted = market_value != 0
+        total_cost = np.bincount(self.broker_codes, weights=cost, minlength=n)
+        total_value = np.bincount(self.broker_codes, weights=np.where(counted, market_value, 0.0), minlength=n)
+        broker_gain = np.bincount(self.broker_codes, weights=np.where(counted, gain_loss, 0.0), minlength=n)
+        return {
+            broker: {
+                "total_cost": float(total_cost[i]),
+                "total_value": float(total_value[i]),
+                "gain_loss": float(broker_gain[i]),
+            }
+            for i, broker in enumerate(self.brokers)
+        }
+
+    def _positions_summary(self, cost, market_value) -> List[Dict]:
+        n = len(self.symbols)
+        if n == 0:
+            return []
+        symbol_value = np.bincount(self.symbol_codes, weights=market_value, minlength=n)
+        symbol_cost = np.bincount(self.symbol_codes, weights=cost, minlength=n)
+        symbol_quantity = np.bincount(self.symbol_codes, weights=self.quantity, minlength=n)
+
+        # Price of the first position seen for each symbol
+        first_seen = np.full(n, len(self.symbol_codes), dtype=np.int64)
+        np.minimum.at(first_seen, self.symbol_codes, np.arange(len(self.symbol_codes)))
+        symbol_price = self.price[first_seen]
+
+        # Largest market value first; the stable sort keeps first-seen order for ties
+        order = np.argsort(-symbol_value, kind="stable")
+        return [
+            {
+                "symbol": self.symbols[i],
+                "market_value": float(symbol_value[i]),
+                "total_cost": float(symbol_cost[i]),
+                "quantity": float(symbol_quantity[i]),
+                "current_price": None if np.isnan(symbol_price[i]) else float(symbol_price[i]),
+                "gain_loss": float(symbol_value[i] - symbol_cost[i]),
+            }
+            for i in order.tolist()
+        ]
+
+def build_position_book(positions, brokers: Sequence[str]) -> Optional[PositionBook]:
+    """Columnar book for the positions, or None when numpy isn't installed"""
+    if not NUMPY_AVAILABLE:
+        return None
+    return PositionBook.from_positions(positions, brokers)
@@ -0,0 +1,161 @@
+# Background price refresher publishing portfolio snapshots
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import time
+from ..config import settings
+from ..utils.broadcaster import Broadcaster
+from ..utils.single_flight import SingleFlight
+from .sheet_writeback import SheetWriteback
+from .summary_payload import SummaryPayload
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class PortfolioSnapshot:
+    """A published portfolio summary. Never mutated once published; each refresh builds a new one."""
+    version: int
+    summary: Dict
+    refreshed_at: datetime
+    payload: Optional[SummaryPayload] = None
+
+class PriceRefresher:
+    """Refreshes a tracker's prices on an interval and publishes the result as a snapshot.
+
+    When the provider budget only allows `budget` symbols per cycle, symbols
+    are picked by their share of portfolio value times how long ago they were
+    last refreshed, so large positions stay fresher while small ones still
+    get their turn.
+
+    Refreshes and reloads are single-flight: concurrent callers join the one
+    already running and share its snapshot. Each refresh that moves a price
+    publishes a summary delta to `updates` for streaming clients and, with
+    sheet_writeback on, schedules a debounced write-back to the sheet.
+    """
+
+    NEVER_REFRESHED_AGE = 10 ** 9
+
+    def __init__(self, tracker, interval: Optional[float] = None, budget: Optional[int] = None):
+        self.tracker = tracker
+        self.interval = interval if interval is not None else settings.price_refresh_interval
+        self.budget = budget if budget is not None else settings.price_refresh_budget
+        self._snapshot: Optional[PortfolioSnapshot] = None
+        self._version = 0
+        self._last_refreshed: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flights = SingleFlight()
+        self.updates = Broadcaster(settings.stream_queue_size)
+        self.writeback = SheetWriteback(tracker) if settings.sheet_writeback else None
+
+    @property
+    def snapshot(self) -> Optional[PortfolioSnapshot]:
+        return self._snapshot
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.writeback is not None:
+            await self.writeback.stop()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.exception("Background price refresh failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def prioritize(self, now: Optional[float] = None) -> List[str]:
+        """Symbols to refresh this cycle, most valuable and most stale first"""
+        now = now if now is not None else time.monotonic()
+
+        values: Dict[str, float] = {}
+        for position in self.tracker.positions:
+            value = position.market_value
+            if value is None:
+                value = position.quantity * position.cost_basis
+            values[position.symbol] = values.get(position.symbol, 0.0) + value
+
+        total = sum(values.values()) or 1.0
+        scores = {}
+        for symbol, value in values.items():
+            last = self._last_refreshed.get(symbol)
+            # Never-refreshed symbols always go first
+            age = self.NEVER_REFRESHED_AGE if last is None else now - last
+            # Floor the weight so zero-value symbols are still refreshed eventually
+            weight = max(value / total, 1e-6)
+            scores[symbol] = weight * (age + self.interval)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        if self.budget and self.budget > 0:
+            ranked = ranked[:self.budget]
+        return ranked
+
+    async def refresh_once(self, full: bool = False) -> PortfolioSnapshot:
+        """Refresh one cycle of prices and publish a new snapshot.
+
+        With `full`, every symbol is refreshed regardless of the budget.
+        A cycle requested while a full refresh is running joins the full one.
+        """
+        if full or self._flights.in_flight("full"):
+            return await self._flights.do("full", lambda: self._refresh(full=True))
+        return await self._flights.do("cycle", lambda: self._refresh(full=False))
+
+    async def reload(self) -> PortfolioSnapshot:
+        """Re-read positions from the sheet, then refresh every price"""
+        return await self._flights.do("reload", self._reload)
+
+    async def _reload(self) -> PortfolioSnapshot:
+        # Sheets reads are blocking, so keep them off the event loop
+        changed = await asyncio.to_thread(self.tracker.load_positions)
+        # A full refresh already running priced the positions from before the load, so let it
+        # finish and start a new one rather than join it
+        await self._flights.wait("full")
+        snapshot = await self.refresh_once(full=True)
+        if changed:
+            # Positions were added or removed; deltas can't express that, so resync streams
+            self.updates.publish(None)
+            if self.writeback is not None:
+                self.writeback.schedule()
+        return snapshot
+
+    async def _refresh(self, full: bool) -> PortfolioSnapshot:
+        now = time.monotonic()
+        if full:
+            symbols = list(dict.fromkeys(p.symbol for p in self.tracker.positions))
+        else:
+            symbols = self.prioritize(now)
+
+        if symbols:
+            prices = await self.tracker.async_market_data.get_multiple_prices(symbols)
+            changed = self.tracker.apply_prices(prices)
+            for symbol in prices:
+                self._last_refreshed[symbol] = now
+            if changed and len(self.updates):
+                self.updates.publish(self.tracker.summary_delta(changed))
+            if changed and self.writeback is not None:
+                self.writeback.schedule()
+
+        return self.publish()
+
+    def publish(self) -> PortfolioSnapshot:
+        """Publish the tracker's current state as a new snapshot"""
+        self._version += 1
+        self._snapshot = PortfolioSnapshot(
+            version=self._version,
+            summary=self.tracker.get_summary(),
+            refreshed_at=datetime.now(),
+            payload=self.tracker.get_summary_payload(),
+        )
+        return self._snapshot
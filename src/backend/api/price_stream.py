@@ -0,0 +1,47 @@
+# Server-sent event stream of portfolio price updates
+from typing import AsyncIterator, Optional
+import asyncio
+import json
+from ..utils.broadcaster import CLOSED
+
+def format_event(event: str, data: str, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+async def portfolio_events(refresher, keepalive: float) -> AsyncIterator[str]:
+    """SSE stream for one client: the full summary first, then a delta per price change.
+
+    Deltas come from the refresher's shared refresh loop, so any number of
+    clients stay live without polling. A client that falls behind gets a
+    fresh `snapshot` event in place of the deltas it missed. The stream ends
+    when the refresher's updates are closed (e.g. the portfolio was evicted);
+    EventSource then reconnects to a freshly opened one.
+    """
+    updates = refresher.updates.subscribe()
+    try:
+        yield await _snapshot_event(refresher)
+        while True:
+            try:
+                delta = await asyncio.wait_for(updates.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # Comment line so proxies don't close an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if delta is CLOSED:
+                return
+            if delta is None:
+                yield await _snapshot_event(refresher)
+            else:
+                yield format_event("delta", json.dumps(delta, separators=(",", ":")), delta["version"])
+    finally:
+        refresher.updates.unsubscribe(updates)
+
+async def _snapshot_event(refresher) -> str:
+    snapshot = refresher.snapshot
+    if snapshot is None:
+        snapshot = await refresher.refresh_once(full=True)
+    # The published payload is already serialized JSON
+    return format_event("snapshot", snapshot.payload.body.decode(), snapshot.payload.version)
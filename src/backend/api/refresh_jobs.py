@@ -0,0 +1,78 @@
+# Background portfolio refresh jobs that clients can poll
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RefreshJob:
+    id: str
+    status: str  # "running", "succeeded" or "failed"
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    snapshot_version: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "snapshot_version": self.snapshot_version,
+            "error": self.error,
+        }
+
+class RefreshJobs:
+    """Runs refreshes as background tasks and remembers the most recent jobs.
+
+    Submitting while a job for the same key (e.g. the same portfolio) is
+    still running returns that job, so concurrent callers poll the same
+    refresh instead of queueing duplicates.
+    """
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._current: Dict[Hashable, RefreshJob] = {}
+
+    def submit(self, run: Callable[[], Awaitable], key: Hashable = None) -> RefreshJob:
+        current = self._current.get(key)
+        if current is not None and current.status == "running":
+            return current
+
+        job = RefreshJob(id=uuid.uuid4().hex, status="running", started_at=datetime.now())
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        self._current[key] = job
+
+        task = asyncio.get_running_loop().create_task(self._run(job, run))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _run(self, job: RefreshJob, run: Callable[[], Awaitable]):
+        try:
+            snapshot = await run()
+            job.snapshot_version = snapshot.version
+            job.status = "succeeded"
+        except Exception as e:
+            logger.exception("Refresh job %s failed: %s", job.id, e)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.now()
+
+    def get(self, job_id: str) -> Optional[RefreshJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
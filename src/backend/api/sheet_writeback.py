@@ -0,0 +1,92 @@
+# Debounced, batched write-back of computed position values to the sheet
+from typing import Dict, List, Optional
+import asyncio
+import logging
+from ..config import settings
+from .broker_schema import get_schema
+from .portfolio_tracker import BrokerSheet
+
+logger = logging.getLogger(__name__)
+
+class SheetWriteback:
+    """Writes each position's computed values (market value, gain/loss) back to its sheet row.
+
+    Price refreshes only schedule a flush; the flush runs once the debounce
+    window has passed, so a burst of refreshes becomes a single write. Each
+    flush diffs every write-back cell against what was last written and
+    sends the changed ones in one batchUpdate, so quota use stays at one
+    request per flush however many positions there are. A failed flush is
+    retried with exponential backoff, so the cells still get written when
+    prices stop moving.
+    """
+
+    def __init__(self, tracker, debounce: Optional[float] = None):
+        self.tracker = tracker
+        self.debounce = debounce if debounce is not None else settings.writeback_debounce
+        # A1 cell -> value last written there, for the position list it was written from
+        self._written: Dict[str, float] = {}
+        self._written_positions: Optional[List] = None
+        self._task: Optional[asyncio.Task] = None
+        # Resolved up front so a misconfigured column fails when write-back is set up, not on every flush
+        self._columns = {broker: get_schema(broker.value).writeback_columns() for broker in BrokerSheet}
+
+    def cells(self) -> Dict[str, float]:
+        """Current write-back value of every cell, keyed by A1 reference"""
+        cells = {}
+        for position in self.tracker.positions:
+            if position.row is None:
+                continue
+            schema = get_schema(position.broker.value)
+            for column in self._columns[position.broker]:
+                value = getattr(position, column.field)
+                # Unpriced positions leave their cells alone rather than blanking them
+                if value is not None:
+                    cells[schema.cell(column, position.row)] = round(value, 2)
+        return cells
+
+    def schedule(self):
+        """Flush after the debounce window, unless a flush is already pending"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        delay = self.debounce
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                # The cells stay unwritten; retry them even if no further refresh schedules a flush
+                delay = min(max(delay * 2, 1.0), settings.writeback_retry_max)
+                logger.warning("Sheet write-back failed, retrying in %.0fs: %s", delay, e,
+                               extra={"event": "sheet_writeback_failed", "retry_in": delay})
+
+    async def flush(self) -> int:
+        """Write every changed cell in one batchUpdate, returning how many cells were written"""
+        positions = self.tracker.positions
+        if positions is not self._written_positions:
+            # A reload can move rows, so what was written where no longer applies
+            self._written = {}
+            self._written_positions = positions
+
+        changed = {cell: value for cell, value in self.cells().items() if self._written.get(cell) != value}
+        if not changed:
+            return 0
+
+        data = [{"range": cell, "values": [[value]]} for cell, value in changed.items()]
+        # The Sheets client is blocking
+        await asyncio.to_thread(self.tracker.sheets_client.batch_update, data)
+        self._written.update(changed)
+        logger.info("Wrote %d cells back to the sheet", len(changed),
+                    extra={"event": "sheet_writeback", "cells": len(changed)})
+        return len(changed)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,57 @@
+# Pre-serialized portfolio summary responses with ETags and gzip
+from dataclasses import dataclass
+from typing import Dict, Optional
+import gzip
+import hashlib
+import json
+
+@dataclass(frozen=True)
+class SummaryPayload:
+    """A summary serialized once per version, ready to be written to any number of responses"""
+    version: int
+    body: bytes
+    etag: str
+    gzip_body: Optional[bytes] = None  # Only set for bodies worth compressing
+
+    @property
+    def gzip_etag(self) -> str:
+        """Strong ETag of the gzip variant; RFC 9110 requires it to differ from the identity one"""
+        return self.etag[:-1] + '-gz"'
+
+def build_summary_payload(summary: Dict, version: int, gzip_min_size: int) -> SummaryPayload:
+    body = json.dumps(summary, separators=(",", ":")).encode()
+    # Strong ETag: derived from the exact bytes, so equal bodies always share it
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    gzip_body = gzip.compress(body, compresslevel=6) if len(body) >= gzip_min_size else None
+    return SummaryPayload(version=version, body=body, etag=etag, gzip_body=gzip_body)
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """Whether an If-None-Match header matches any of the ETags (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") in etags for tag in candidates)
+
+def accepts_encoding(accept_encoding: Optional[str], coding: str) -> bool:
+    """Whether an Accept-Encoding header allows a content coding, honouring q-values (q=0 refuses it)"""
+    if not accept_encoding:
+        return False
+    wildcard = None
+    for item in accept_encoding.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.lower() == coding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality
+    # A listed coding takes precedence over "*"
+    return wildcard is not None and wildcard > 0
@@ -1,10 +1,11 @@
 # Configuration settings
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Google Sheets info
-    sheet_id: str
+    sheet_id: str  # Default portfolio
     sheet_name: str = "Portfolio"
     credentials_path: str = "credentials/google_credentials.json"  # Fixed to match actual filename
 
@@ -15,7 +16,71 @@ class Settings(BaseSettings):
 
     # Market data (seconds)
     cache_duration: int = 60
-    rate_limit_delay: float = 1.0  # Increased to 1 second between requests
+    cache_max_size: int = 500
+    cache_stale_while_revalidate: int = 300  # Serve stale prices while refreshing in the background
+    cache_stale_if_error: int = 86400  # Serve expired prices when every provider fails
+    cache_miss_ttl: int = 60  # Serve the fallback price for a symbol no provider could price without retrying it
+    quote_store_path: Optional[str] = None  # SQLite file for warm starts, e.g. /tmp/portfolio-sync/quotes.db
+    price_history_dir: Optional[str] = None  # Directory for stored close history, e.g. /tmp/portfolio-sync/history
+    history_backfill_days: int = 1825  # Daily bars fetched the first time a symbol's history is requested
+    rate_limit_delay: float = 1.0  # Spacing for providers without their own token bucket
+    max_price_symbols: int = 200  # Most symbols one /api/prices request may ask for
+    max_price_workers: int = 8  # Concurrent symbol fetches in get_multiple_prices
+    quote_batch_size: int = 50  # Symbols per multi-symbol quote request
+    http_max_connections: int = 20  # Async HTTP connection pool size
+    http_max_keepalive: int = 10  # Idle keep-alive connections kept in the pool
+
+    # Provider circuit breaker
+    circuit_breaker_threshold: int = 3  # Consecutive failures before a provider is skipped
+    circuit_breaker_cooldown: float = 60.0  # Seconds to skip a provider once its circuit opens
+    provider_health_window: int = 50  # Recent calls used for success rate and latency
+
+    # Hedged provider requests
+    hedged_requests: bool = False  # Fire the next provider when the current one is slow
+    hedge_delay: float = 0.5  # Seconds before hedging; 0 races the top providers at once
+    hedge_max_parallel: int = 2  # Providers in flight per symbol
+
+    # Background price refresh
+    background_refresh: bool = True
+    price_refresh_interval: float = 60.0  # Seconds between refresh cycles
+    price_refresh_budget: int = 0  # Max symbols refreshed per cycle; 0 refreshes every symbol
+
+    # Portfolio aggregation
+    columnar_positions: bool = True  # Vectorized summaries via numpy when it is installed
+    columnar_min_positions: int = 200  # Below this, plain loops are faster than building arrays
+    summary_rebuild_interval: int = 1000  # Incremental symbol updates before a full re-aggregation
+    gzip_min_size: int = 1024  # Summary bodies at least this many bytes are also served gzipped
+
+    # Sheet write-back
+    sheet_writeback: bool = False  # Write each position's market value and gain/loss back to its row
+    writeback_debounce: float = 5.0  # Seconds of price changes collected into one batchUpdate
+    writeback_retry_max: float = 300.0  # Longest wait between retries of a failed write-back
+    # Market value and gain/loss columns per broker tab; must sit outside the read range, empty disables
+    fidelity_writeback_columns: str = "E,F"
+    webull_writeback_columns: str = "D,E"
+    kraken_writeback_columns: str = "D,E"
+
+    # Multi-portfolio serving
+    max_portfolios: int = 20  # Portfolios (sheet ids) kept loaded; the least recently used is closed first
+    allowed_sheet_ids: List[str] = []  # Sheet ids besides sheet_id that may be requested; JSON list in the env
+
+    # Price streaming
+    stream_keepalive: float = 15.0  # Seconds between keepalive comments on idle streams
+    stream_queue_size: int = 100  # Deltas buffered per client before it is resynced with a snapshot
+
+    # Per-provider token buckets (requests per second, burst size)
+    yahoo_rate_limit: float = 5.0
+    yahoo_burst: int = 10
+    fmp_rate_limit: float = 0.5
+    fmp_burst: int = 5
+    iex_rate_limit: float = 1.0
+    iex_burst: int = 5
+    yfinance_rate_limit: float = 1.0
+    yfinance_burst: int = 2
+
+    # Logging
+    log_level: str = "INFO"
+    log_format: str = "text"  # "text" or "json"
 
     model_config = {"env_file": ".env"}
 
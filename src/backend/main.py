@@ -1,13 +1,74 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from .api.portfolio_tracker import PortfolioTracker
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from .api.portfolio_registry import PortfolioNotAllowed, PortfolioRegistry
+from .api.price_refresher import PriceRefresher
+from .api.refresh_jobs import RefreshJobs
+from .api.summary_payload import SummaryPayload, accepts_encoding, etag_matches
+from .api.price_stream import portfolio_events
 from .config import settings
+from .utils.async_market_data import AsyncMarketDataService
+from .utils.market_data import MarketDataService
+from .utils.log_config import configure_logging
+import asyncio
+import logging
 import os
 
+configure_logging(settings.log_level, settings.log_format)
+logger = logging.getLogger(__name__)
+
+# Trackers read their sheet when they are created, so each portfolio is opened on first use
+# (the default one is warmed up in the background at startup) instead of at import time
+portfolios: Optional[PortfolioRegistry] = None
+market_data: Optional[AsyncMarketDataService] = None
+refresh_jobs = RefreshJobs()
+
+def get_market_data() -> AsyncMarketDataService:
+    """Market data service shared by every portfolio and the price endpoint, so they share one cache"""
+    global market_data
+    if market_data is None:
+        market_data = AsyncMarketDataService(MarketDataService())
+    return market_data
+
+def get_portfolios() -> PortfolioRegistry:
+    global portfolios
+    if portfolios is None:
+        portfolios = PortfolioRegistry(get_market_data())
+    return portfolios
+
+async def get_price_refresher(sheet_id: Optional[str] = None) -> PriceRefresher:
+    """The price refresher and tracker for a portfolio (settings.sheet_id by default), opened once on first use"""
+    try:
+        return await get_portfolios().get(sheet_id)
+    except PortfolioNotAllowed as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+async def _warm_up():
+    try:
+        await get_price_refresher()
+    except Exception as e:
+        # Don't stop the app from booting; the next request retries
+        logger.warning("Portfolio warm-up failed: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up = asyncio.create_task(_warm_up())
+    yield
+    warm_up.cancel()
+    refresh_jobs.cancel()
+    if portfolios is not None:
+        await portfolios.close()
+    if market_data is not None:
+        # Close pooled HTTP connections on shutdown
+        await market_data.aclose()
+
 # Initialize FastAPI app
-app = FastAPI(title="PortfolioSync")
+app = FastAPI(title="PortfolioSync", lifespan=lifespan)
 
 # CORS middleware for frontend access
 app.add_middleware(
@@ -28,28 +89,162 @@ async def read_index():
     index_path = os.path.join(os.path.dirname(__file__), "..", "..", "index.html")
     return FileResponse(index_path)
 
-# Initialize portfolio tracker
-portfolio_tracker = PortfolioTracker()
+def _payload_response(payload: SummaryPayload, request: Request) -> Response:
+    use_gzip = payload.gzip_body is not None and accepts_encoding(request.headers.get("accept-encoding"), "gzip")
+    # no-cache: clients keep the body but revalidate it with If-None-Match every time
+    headers = {"ETag": payload.gzip_etag if use_gzip else payload.etag,
+               "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    # Either variant's ETag means the client already has this version
+    if etag_matches(request.headers.get("if-none-match"), payload.etag, payload.gzip_etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
 
 @app.get("/api/portfolio/summary")
-async def get_portfolio():
+async def get_portfolio(request: Request, sheet_id: Optional[str] = None):
+    """
+    Get current portfolio data from all accounts. Answers 304 when If-None-Match
+    carries the current ETag. Every portfolio endpoint takes an optional `sheet_id`
+    to serve a portfolio other than the default one.
+    """
+    try:
+        refresher = await get_price_refresher(sheet_id)
+        # Serve the background refresher's snapshot; only refresh inline before the first one exists
+        snapshot = refresher.snapshot
+        if snapshot is None:
+            snapshot = await refresher.refresh_once(full=True)
+        return _payload_response(snapshot.payload, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/portfolio/stream")
+async def stream_portfolio(sheet_id: Optional[str] = None):
     """
-    Get current portfolio data from all accounts
+    Server-sent events: a `snapshot` event with the full summary, then a `delta` event
+    with the changed positions, affected brokers and new totals whenever prices move
     """
     try:
-        portfolio_tracker.update_prices()
-        return portfolio_tracker.get_summary()
+        refresher = await get_price_refresher(sheet_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        portfolio_events(refresher, settings.stream_keepalive),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/api/portfolio/refresh")
-async def refresh_portfolio():
+async def refresh_portfolio(background: bool = False, sheet_id: Optional[str] = None):
     """
-    Force refresh of portfolio data and update prices
+    Force refresh of portfolio data and update prices. Concurrent refreshes share one run;
+    with `background=true` it returns a job id to poll instead of waiting.
     """
     try:
-        portfolio_tracker.load_positions()
-        portfolio_tracker.update_prices()
+        refresher = await get_price_refresher(sheet_id)
+        if background:
+            job = refresh_jobs.submit(refresher.reload, key=refresher.tracker.sheet_id)
+            return JSONResponse(job.to_dict(), status_code=202)
+        await refresher.reload()
         return {"status": "success", "message": "Portfolio refreshed"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/portfolio/load-report")
+async def get_load_report(sheet_id: Optional[str] = None):
+    """
+    Get how many sheet rows loaded per broker, and which rows were rejected and why
+    """
+    try:
+        refresher = await get_price_refresher(sheet_id)
+        return {"brokers": refresher.tracker.load_report()}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/portfolio/refresh/{job_id}")
+async def get_refresh_job(job_id: str):
+    """
+    Get the status of a background refresh job
+    """
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job.to_dict()
+
+@app.get("/api/prices")
+async def get_prices(symbols: str):
+    """
+    Get quotes for a comma-separated list of symbols in one request, with each price's
+    source and fetch time. Served from the shared quote cache, so upstream calls don't
+    grow with the number of viewers.
+    """
+    requested = list(dict.fromkeys(symbol.strip() for symbol in symbols.split(",") if symbol.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No symbols requested")
+    if len(requested) > settings.max_price_symbols:
+        raise HTTPException(status_code=400, detail=f"At most {settings.max_price_symbols} symbols per request")
+    try:
+        quotes = await get_market_data().get_quotes(requested)
+        return {"quotes": quotes, "as_of": datetime.now().isoformat()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/history/{symbol}")
+async def get_price_history(symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+                            interval: str = "1d"):
+    """
+    Get stored closes for a symbol between two unix timestamps. Only bars newer than
+    the last stored one are fetched from the provider.
+    """
+    service = get_market_data().market_data
+    if service.history is None:
+        raise HTTPException(status_code=503, detail="Price history is not configured")
+    try:
+        # File reads and provider calls are blocking
+        bars = await run_in_threadpool(service.get_history, symbol, start, end, interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "symbol": symbol,
+        "interval": interval,
+        "timestamps": bars["ts"].astype("int64").tolist(),
+        "closes": bars["close"].tolist(),
+    }
+
+@app.get("/api/portfolio/performance")
+async def get_portfolio_performance(start: Optional[int] = None, end: Optional[int] = None,
+                                    interval: str = "1d", sheet_id: Optional[str] = None):
+    """
+    Get portfolio, broker and symbol value series between two unix timestamps, with
+    time-weighted and money-weighted returns
+    """
+    if get_market_data().market_data.history is None:
+        raise HTTPException(status_code=503, detail="Price history is not configured")
+    try:
+        refresher = await get_price_refresher(sheet_id)
+        # Backfill and file reads are blocking
+        return await run_in_threadpool(refresher.tracker.get_performance, start, end, interval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/health/providers")
+async def get_provider_health():
+    """
+    Get market data provider health and circuit breaker state
+    """
+    return get_market_data().market_data.provider_health()
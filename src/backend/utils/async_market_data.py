@@ -0,0 +1,382 @@
+# Asyncio market data service on a pooled HTTP client
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import inspect
+import logging
+import time
+import httpx
+from ..config import settings
+from .market_data import (
+    MarketDataService, MarketDataError, YFINANCE_AVAILABLE,
+    YAHOO_CHART_URL, YAHOO_QUOTE_URL, FMP_QUOTE_URL, IEX_QUOTE_URL, YAHOO_HEADERS,
+    parse_yahoo_chart, parse_yahoo_quotes, parse_fmp_quote, parse_iex_quote, log_price_refresh,
+)
+
+logger = logging.getLogger(__name__)
+
+class AsyncMarketDataService:
+    """Async counterpart of MarketDataService for use from the FastAPI event loop.
+
+    Provider calls go through one keep-alive httpx.AsyncClient, so many symbol
+    fetches overlap on a single thread. The quote cache, rate limiter and
+    provider health are shared with the wrapped MarketDataService, so sync and
+    async callers see the same prices and respect the same quotas.
+    """
+
+    def __init__(self, market_data: Optional[MarketDataService] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.market_data = market_data or MarketDataService()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        # Provider symbol -> (price, source) future of the call currently fetching it
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=YAHOO_HEADERS,
+                timeout=10,
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        for task in self._refresh_tasks.values():
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_price(self, symbol: str) -> float:
+        """Async get_price with the same cache, stale-while-revalidate and stale-if-error rules"""
+        symbol = self.market_data.format_symbol(symbol)
+
+        # Special handling for cash
+        if symbol.upper() == 'CASH':
+            return 1.0
+
+        cached_price = self._cached_price(symbol)
+        if cached_price is not None:
+            return cached_price
+
+        try:
+            price, source = await self._fetch_price(symbol)
+        except MarketDataError:
+            stale_price = self.market_data.stale_price_on_error(symbol)
+            if stale_price is not None:
+                return stale_price
+            raise
+
+        self.market_data.cache.set(symbol, price, source)
+        return price
+
+    def _cached_price(self, symbol: str, stale: Optional[List[str]] = None) -> Optional[float]:
+        # Same rules as MarketDataService._cached_price: stale entries go to `stale` when given
+        price, needs_revalidation = self.market_data.cache_lookup(symbol)
+        if needs_revalidation:
+            if stale is None:
+                self._refresh_in_background(symbol)
+            else:
+                stale.append(symbol)
+        return price
+
+    def _track_refresh(self, symbols: List[str], task: asyncio.Task):
+        for symbol in symbols:
+            self._refresh_tasks[symbol] = task
+
+        def release(_):
+            for symbol in symbols:
+                if self._refresh_tasks.get(symbol) is task:
+                    del self._refresh_tasks[symbol]
+        task.add_done_callback(release)
+
+    def _refresh_in_background(self, symbol: str):
+        # Only one background refresh per symbol at a time
+        if symbol in self._refresh_tasks:
+            return
+        self._track_refresh([symbol], asyncio.get_running_loop().create_task(self._revalidate(symbol)))
+
+    async def _revalidate(self, symbol: str):
+        try:
+            price, source = await self._fetch_price(symbol)
+            self.market_data.cache.set(symbol, price, source)
+        except MarketDataError as e:
+            logger.warning("Background refresh failed for %s: %s", symbol, e)
+
+    def _refresh_batch_in_background(self, symbols: List[str]):
+        """Revalidate many stale symbols in one background task"""
+        symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._refresh_tasks]
+        if symbols:
+            self._track_refresh(symbols, asyncio.get_running_loop().create_task(self._revalidate_batch(symbols)))
+
+    async def _revalidate_batch(self, symbols: List[str]):
+        # One batched quote request, then only its misses, bounded like get_multiple_prices
+        try:
+            priced = await self.get_quotes_batch(symbols)
+            missing = [symbol for symbol in symbols if symbol not in priced]
+            semaphore = asyncio.Semaphore(max(1, settings.max_price_workers))
+
+            async def revalidate(symbol: str):
+                async with semaphore:
+                    await self._revalidate(symbol)
+
+            await asyncio.gather(*(revalidate(symbol) for symbol in missing))
+        except Exception as e:
+            logger.warning("Background refresh failed for %d symbols: %s", len(symbols), e)
+
+    def _providers(self) -> Dict[str, Callable[[str], Awaitable[Optional[float]]]]:
+        """Per-symbol price providers in their default fallback order"""
+        providers = {
+            "yahoo": self._try_yahoo_query_api,
+            "fmp": self._try_fmp_api,
+            "iex": self._try_iex_api,
+        }
+        if YFINANCE_AVAILABLE:
+            providers["yfinance"] = self._try_yfinance
+        return providers
+
+    async def _fetch_price(self, symbol: str) -> Tuple[float, str]:
+        """Walk the provider chain in health order, returning the price and its source"""
+        health = self.market_data.health
+        providers = self._providers()
+
+        if settings.hedged_requests:
+            return await self._fetch_price_hedged(symbol, providers)
+
+        for provider in health.available(providers):
+            price = await self._call_provider(provider, providers[provider], symbol)
+            if price:
+                return price, provider
+
+        raise MarketDataError(f"All methods failed for {symbol}")
+
+    async def _fetch_price_hedged(self, symbol: str,
+                                  providers: Dict[str, Callable[[str], Awaitable[Optional[float]]]]) -> Tuple[float, str]:
+        """Hedged provider chain: first valid price wins and the losing requests are cancelled"""
+        health = self.market_data.health
+        queue = health.available(providers)
+        pending: Dict[asyncio.Task, str] = {}
+
+        def launch_next() -> bool:
+            for provider in queue:
+                task = asyncio.ensure_future(self._call_provider(provider, providers[provider], symbol))
+                pending[task] = provider
+                return True
+            return False
+
+        exhausted = not launch_next()
+        try:
+            while pending:
+                can_hedge = not exhausted and len(pending) < settings.hedge_max_parallel
+                done, _ = await asyncio.wait(list(pending), timeout=settings.hedge_delay if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Current providers are slow: hedge with the next one
+                    exhausted = not launch_next()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    price = task.result()
+                    if price:
+                        return price, provider
+
+                # Move on to the next provider straight away when one comes back empty
+                if not exhausted:
+                    exhausted = not launch_next()
+        finally:
+            for task, provider in pending.items():
+                # A task cancelled before its first step never enters _call_provider, so free its trial here
+                if inspect.getcoroutinestate(task.get_coro()) == inspect.CORO_CREATED:
+                    health.release(provider)
+                task.cancel()
+
+        raise MarketDataError(f"All methods failed for {symbol}")
+
+    async def _call_provider(self, provider: str, fetch: Callable[[str], Awaitable[Optional[float]]],
+                             symbol: str) -> Optional[float]:
+        """Call one provider and record the outcome in its health stats"""
+        health = self.market_data.health
+        start = time.monotonic()
+        try:
+            price = await fetch(symbol)
+        except asyncio.CancelledError:
+            # Nothing to record, but a half-open trial must not stay claimed by a call that never finished
+            health.release(provider)
+            raise
+        except Exception as e:
+            health.record_error(provider, time.monotonic() - start, e)
+            logger.debug("%s failed for %s: %s", provider, symbol, e)
+            return None
+
+        # An answer without a price keeps the circuit closed but counts against the provider's ranking
+        health.record_success(provider, time.monotonic() - start, priced=bool(price))
+        return price
+
+    async def _get_json(self, provider: str, url: str, **kwargs):
+        await self.market_data.rate_limiter.acquire_async(provider)
+        response = await self.client.get(url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _try_yahoo_query_api(self, symbol: str) -> Optional[float]:
+        data = await self._get_json("yahoo", YAHOO_CHART_URL.format(symbol=symbol))
+        price = parse_yahoo_chart(data)
+        if settings.price_history_dir:
+            # History files are blocking disk I/O, so merge the bars on a worker thread
+            await asyncio.to_thread(self.market_data.keep_chart_bars, symbol, data)
+        return price
+
+    async def _try_fmp_api(self, symbol: str) -> Optional[float]:
+        return parse_fmp_quote(await self._get_json("fmp", FMP_QUOTE_URL.format(symbol=symbol)))
+
+    async def _try_iex_api(self, symbol: str) -> Optional[float]:
+        return parse_iex_quote(await self._get_json("iex", IEX_QUOTE_URL.format(symbol=symbol)))
+
+    async def _try_yfinance(self, symbol: str) -> Optional[float]:
+        # yfinance has no async API, so run it on a worker thread
+        return await asyncio.to_thread(self.market_data._try_yfinance, symbol)
+
+    async def get_quotes_batch(self, symbols: List[str]) -> Dict[str, float]:
+        """Async get_quotes_batch: all chunks are requested concurrently"""
+        prices, requested = self.market_data.group_provider_symbols(symbols)
+        chunks = self.market_data.batch_chunks(list(requested))
+        results = await asyncio.gather(*(self._fetch_quote_chunk(chunk) for chunk in chunks))
+
+        for quotes in results:
+            self.market_data.store_batch_quotes(quotes, requested, prices)
+        return prices
+
+    async def _fetch_quote_chunk(self, chunk: List[str]) -> Dict[str, float]:
+        health = self.market_data.health
+        if not health.allow("yahoo"):
+            return {}
+
+        start = time.monotonic()
+        try:
+            data = await self._get_json("yahoo", YAHOO_QUOTE_URL, params={'symbols': ','.join(chunk)})
+        except Exception as e:
+            health.record_error("yahoo", time.monotonic() - start, e)
+            logger.warning("Yahoo batch quote failed for %d symbols: %s", len(chunk), e)
+            return {}
+        quotes = parse_yahoo_quotes(data)
+        # A batch that priced nothing counts against Yahoo's ranking like an empty single quote
+        health.record_success("yahoo", time.monotonic() - start, priced=bool(quotes))
+        return quotes
+
+    async def get_multiple_prices(self, symbols: List[str], max_concurrency: Optional[int] = None) -> Dict[str, float]:
+        """Async get_multiple_prices: cache, then batch quotes, then bounded per-symbol fan-out"""
+        started = time.monotonic()
+        unique_symbols = list(dict.fromkeys(symbols))
+        if not unique_symbols:
+            return {}
+
+        prices = {}
+        sources = {}
+        stale = []
+        for symbol in unique_symbols:
+            cached_price = self._cached_price(self.market_data.format_symbol(symbol), stale)
+            if cached_price is not None:
+                prices[symbol] = cached_price
+                sources[symbol] = "cache"
+                continue
+            fallback = self.market_data.recent_fallback(symbol)
+            if fallback is not None:
+                prices[symbol] = fallback
+                sources[symbol] = "fallback"
+        if stale:
+            # Stale prices are served now and revalidated together, not one task per symbol
+            self._refresh_batch_in_background(stale)
+
+        # Symbols another caller (e.g. another portfolio's refresh) is already fetching are
+        # awaited instead of fetched again; this call fetches and publishes the rest
+        uncached = [symbol for symbol in unique_symbols if symbol not in prices]
+        joined: Dict[str, asyncio.Future] = {}
+        owned: Dict[str, Tuple[str, asyncio.Future]] = {}
+        loop = asyncio.get_running_loop()
+        for symbol in uncached:
+            provider_symbol = self.market_data.format_symbol(symbol)
+            future = self._in_flight.get(provider_symbol)
+            if future is not None and provider_symbol not in owned:
+                joined[symbol] = future
+            elif provider_symbol not in owned:
+                self._in_flight[provider_symbol] = loop.create_future()
+                owned[provider_symbol] = (symbol, self._in_flight[provider_symbol])
+
+        try:
+            fetching = [symbol for symbol in uncached if symbol not in joined]
+            if fetching:
+                await self._fetch_uncached(fetching, prices, sources, max_concurrency)
+        finally:
+            for provider_symbol, (symbol, future) in owned.items():
+                del self._in_flight[provider_symbol]
+                future.set_result((prices.get(symbol), sources.get(symbol)))
+
+        for symbol, future in joined.items():
+            price, source = await asyncio.shield(future)
+            if price is None:
+                price, source = self.market_data.fallback_price(symbol), "fallback"
+            prices[symbol] = price
+            sources[symbol] = source
+
+        log_price_refresh(logger, len(symbols), sources, started)
+        return {symbol: prices[symbol] for symbol in unique_symbols}
+
+    async def _fetch_uncached(self, symbols: List[str], prices: Dict[str, float], sources: Dict[str, str],
+                              max_concurrency: Optional[int]):
+        """Batch quotes, then bounded per-symbol fan-out for whatever the batch missed"""
+        batch_prices = await self.get_quotes_batch(symbols)
+        prices.update(batch_prices)
+        sources.update((symbol, "yahoo-batch") for symbol in batch_prices)
+
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if not missing:
+            return
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or settings.max_price_workers))
+
+        async def resolve(symbol: str) -> Tuple[float, str]:
+            async with semaphore:
+                try:
+                    price = await self.get_price(symbol)
+                except MarketDataError as e:
+                    logger.debug("Real API failed for %s: %s", symbol, e)
+                    return self.market_data.remember_fallback(symbol), "fallback"
+                return price, self.market_data.quote_source(symbol)
+
+        results = await asyncio.gather(*(resolve(symbol) for symbol in missing))
+        for symbol, (price, source) in zip(missing, results):
+            prices[symbol] = price
+            sources[symbol] = source
+
+    async def get_quotes(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Prices for the symbols along with where and when each one was fetched.
+
+        `source` is the provider, "cash", or "fallback" for a mock/heuristic
+        price; `stale` marks cached prices past their TTL that are being
+        served while they revalidate or because every provider failed.
+        """
+        prices = await self.get_multiple_prices(symbols)
+        cache = self.market_data.cache
+        now = time.time()
+
+        quotes = {}
+        for symbol, price in prices.items():
+            quote = {"price": price, "source": "fallback", "fetched_at": None, "stale": False}
+            cached = cache.get(self.market_data.format_symbol(symbol))
+            if symbol.upper() == 'CASH':
+                quote["source"] = "cash"
+            elif cached is not None and cached.price == price:
+                quote["source"] = cached.source
+                quote["fetched_at"] = datetime.fromtimestamp(cached.fetched_at).isoformat()
+                quote["stale"] = not cache.is_fresh(cached, now)
+            quotes[symbol] = quote
+        return quotes
@@ -0,0 +1,57 @@
+# Fan-out of events to any number of asyncio subscribers
+from typing import Any, Set
+import asyncio
+
+# Last item a subscriber receives once the broadcaster is closed
+CLOSED = object()
+
+class Broadcaster:
+    """Delivers each published event to every subscriber's queue.
+
+    Publishing never blocks: when a subscriber falls a whole queue behind,
+    its backlog is dropped and replaced with a single None, telling it to
+    resynchronize from a full snapshot instead of replaying stale events.
+    Closing it hands every subscriber a final CLOSED, so consumers can end
+    rather than wait on a source that will never publish again.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.closed = False
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.closed:
+            queue.put_nowait(CLOSED)
+            return queue
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: Any):
+        if self.closed:
+            return
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._replace_backlog(queue, None)
+
+    def close(self):
+        """Stop publishing and tell every subscriber it is done"""
+        self.closed = True
+        for queue in self._subscribers:
+            self._replace_backlog(queue, CLOSED)
+        self._subscribers.clear()
+
+    @staticmethod
+    def _replace_backlog(queue: asyncio.Queue, event: Any):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
@@ -1,23 +1,37 @@
 # Google Sheets authentication
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
-from typing import List
+from typing import Dict, List, Optional, TYPE_CHECKING
 import json
 import base64
 import os
 from ..config import settings
 
+if TYPE_CHECKING:
+    from google.oauth2.service_account import Credentials
+
 # Google Sheets client for interacting with Google Sheets API
 class GoogleSheetsClient:
     SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
-    # Initializes the GoogleSheetsClient
-    def __init__(self):
-        self.creds = self.get_credentials()
-        self.service = build("sheets", "v4", credentials=self.creds)
+    # Initializes the GoogleSheetsClient for one spreadsheet (settings.sheet_id by default);
+    # credentials and the API service are built on first use
+    def __init__(self, sheet_id: Optional[str] = None):
+        self.sheet_id = sheet_id or settings.sheet_id
+        self._service = None
+
+    # The Sheets API service, built from the discovery document bundled with the client library
+    # rather than fetched over the network
+    @property
+    def service(self):
+        if self._service is None:
+            from googleapiclient.discovery import build
+            self._service = build("sheets", "v4", credentials=self.get_credentials(),
+                                  static_discovery=True, cache_discovery=False)
+        return self._service
 
     # Gets credentials for Google Sheets API using service account
-    def get_credentials(self) -> Credentials:
+    def get_credentials(self) -> "Credentials":
+        from google.oauth2.service_account import Credentials
+
         # Check if we're in a serverless environment (Vercel)
         if os.getenv('GOOGLE_CREDENTIALS_BASE64'):
             # Decode base64 credentials for serverless deployment
@@ -42,9 +56,20 @@ class GoogleSheetsClient:
 
     # Reads a range of data from a Google Sheet
     def read_range(self, range_name: str) -> List[List]:
-        result = self.service.spreadsheets().values().get(spreadsheetId=settings.sheet_id, range=range_name).execute()
+        result = self.service.spreadsheets().values().get(spreadsheetId=self.sheet_id, range=range_name).execute()
         return result.get("values", [])
 
+    # Reads several ranges in a single batchGet request, keyed by the requested range names
+    def read_ranges(self, range_names: List[str]) -> Dict[str, List[List]]:
+        range_names = list(dict.fromkeys(range_names))
+        result = self.service.spreadsheets().values().batchGet(spreadsheetId=self.sheet_id, ranges=range_names).execute()
+
+        # valueRanges come back in request order, but with normalized names (e.g. "Webull!A2:C1000")
+        values = {range_name: [] for range_name in range_names}
+        for range_name, value_range in zip(range_names, result.get("valueRanges", [])):
+            values[range_name] = value_range.get("values", [])
+        return values
+
     #  Updates a batch of data in a Google Sheet, data should be a list of dictionaries with 'range' and 'values' keys
     def batch_update(self, data: List[dict]):
         body = {
@@ -52,4 +77,4 @@ class GoogleSheetsClient:
             'data': data
         }
 
-        return self.service.spreadsheets().values().batchUpdate(spreadsheetId=settings.sheet_id, body=body).execute()
\ No newline at end of file
+        return self.service.spreadsheets().values().batchUpdate(spreadsheetId=self.sheet_id, body=body).execute()
\ No newline at end of file
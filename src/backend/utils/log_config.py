@@ -0,0 +1,52 @@
+# Structured logging setup for the backend
+from datetime import datetime, timezone
+import json
+import logging
+
+# Logger shared by every backend module (src.backend.*)
+PACKAGE_LOGGER = __name__.rsplit(".", 2)[0]
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def event_fields(record: logging.LogRecord) -> dict:
+    """Structured fields attached to a record via `extra=`"""
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED_ATTRS}
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(event_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with extra fields appended as key=value pairs"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = event_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+def configure_logging(level: str = "INFO", fmt: str = "text"):
+    """Attach a single handler to the backend package logger"""
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    logger.setLevel(level.upper())
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter() if fmt == "json" else KeyValueFormatter())
+    logger.handlers = [handler]
+    logger.propagate = False
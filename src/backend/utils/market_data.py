@@ -1,179 +1,545 @@
 import requests
-from functools import lru_cache
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, List, Dict, Optional, Tuple
+from collections import Counter
 from datetime import datetime
+import importlib.util
+import logging
+import threading
 import time
 from ..config import settings
+from .quote_cache import QuoteCache
+from .quote_store import QuoteStore
+from .rate_limiter import RateLimiter
+from .provider_health import ProviderHealthRegistry
 
-# Optional yfinance import for local development
-try:
-    import yfinance as yf
-    YFINANCE_AVAILABLE = True
-except ImportError:
-    YFINANCE_AVAILABLE = False
+# Optional yfinance for local development. It pulls in pandas, so it is only
+# imported the first time it is used rather than when the app starts.
+YFINANCE_AVAILABLE = importlib.util.find_spec("yfinance") is not None
+
+def _yfinance():
+    import yfinance
+    globals()["yf"] = yfinance
+    return yfinance
+
+def __getattr__(name: str):
+    # `market_data.yf` resolves lazily as well
+    if name == "yf" and YFINANCE_AVAILABLE:
+        return _yfinance()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+YAHOO_QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+FMP_QUOTE_URL = "https://financialmodelingprep.com/api/v3/quote-short/{symbol}"
+IEX_QUOTE_URL = "https://cloud.iexapis.com/stable/stock/{symbol}/quote?token=demo"
+# Yahoo only serves limited history at intraday granularity
+HISTORY_INTRADAY_LOOKBACK_DAYS = {"1h": 729, "5m": 59}
+YAHOO_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+logger = logging.getLogger(__name__)
 
 class MarketDataError(Exception):
     pass
 
+def log_price_refresh(log: logging.Logger, requested: int, sources: Dict[str, str], started: float):
+    """Emit one summary event per get_multiple_prices call"""
+    if not log.isEnabledFor(logging.INFO):
+        return
+    by_source = Counter(sources.values())
+    log.info(
+        "Priced %d symbols (%d requested) in %.0f ms",
+        len(sources), requested, (time.monotonic() - started) * 1000,
+        extra={
+            "event": "price_refresh",
+            "symbols": len(sources),
+            "requested": requested,
+            "cache_hits": by_source.get("cache", 0),
+            "fallbacks": by_source.get("fallback", 0),
+            "sources": dict(by_source),
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+        },
+    )
+
+# Response parsers shared by the sync and async services
+
+def parse_yahoo_chart(data: Dict) -> Optional[float]:
+    if data.get('chart', {}).get('result'):
+        result = data['chart']['result'][0]
+        if result.get('meta', {}).get('regularMarketPrice'):
+            return float(result['meta']['regularMarketPrice'])
+        
+        # Try getting from indicators
+        indicators = result.get('indicators', {})
+        if indicators.get('quote') and indicators['quote'][0].get('close'):
+            closes = [x for x in indicators['quote'][0]['close'] if x is not None]
+            if closes:
+                return float(closes[-1])
+    
+    return None
+
+def parse_yahoo_chart_history(data: Dict) -> Tuple[List[int], List[float]]:
+    """Bar timestamps and closes from a Yahoo chart response, skipping empty bars"""
+    timestamps, closes = [], []
+    if data.get('chart', {}).get('result'):
+        result = data['chart']['result'][0]
+        quotes = result.get('indicators', {}).get('quote') or [{}]
+        for ts, close in zip(result.get('timestamp') or [], quotes[0].get('close') or []):
+            if close is not None:
+                timestamps.append(int(ts))
+                closes.append(float(close))
+    return timestamps, closes
+
+def parse_yahoo_quotes(data: Dict) -> Dict[str, float]:
+    prices = {}
+    for quote in (data.get('quoteResponse') or {}).get('result') or []:
+        symbol = quote.get('symbol')
+        price = quote.get('regularMarketPrice')
+        if symbol and price:
+            prices[symbol] = float(price)
+    return prices
+
+def parse_fmp_quote(data) -> Optional[float]:
+    if data and len(data) > 0 and 'price' in data[0]:
+        return float(data[0]['price'])
+    return None
+
+def parse_iex_quote(data: Dict) -> Optional[float]:
+    if 'latestPrice' in data:
+        return float(data['latestPrice'])
+    return None
+
 class MarketDataService:
     def __init__(self):
-        self._last_request_time = 0
+        self.rate_limiter = RateLimiter.from_settings(settings)
+        self.health = ProviderHealthRegistry(
+            failure_threshold=settings.circuit_breaker_threshold,
+            cooldown=settings.circuit_breaker_cooldown,
+            window=settings.provider_health_window,
+        )
+        self._cache = QuoteCache(
+            ttl=settings.cache_duration,
+            max_size=settings.cache_max_size,
+            stale_while_revalidate=settings.cache_stale_while_revalidate,
+            stale_if_error=settings.cache_stale_if_error,
+            store=QuoteStore(settings.quote_store_path) if settings.quote_store_path else None,
+        )
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        # Symbol -> (expiry, fallback price) for symbols every provider recently failed to price
+        self._misses: Dict[str, Tuple[float, float]] = {}
+        self._misses_lock = threading.Lock()
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+        self._history = None
+        self._history_checked: Dict[Tuple[str, str], float] = {}
         # Set up session with headers to avoid blocking
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
 
-    def _rate_limit(self):
-        current_time = time.time()
-        time_since_last_request = current_time - self._last_request_time
-        if time_since_last_request < settings.rate_limit_delay:
-            time.sleep(settings.rate_limit_delay - time_since_last_request)
-        self._last_request_time = time.time()
-
-    @lru_cache(maxsize=100)
     def get_price(self, symbol: str) -> float:
-        self._rate_limit()
+        """Get a price, served from the quote cache when possible.
+
+        Fresh entries are returned directly. Entries inside the
+        stale-while-revalidate window are returned immediately while one
+        background refresh runs, and expired entries are still served
+        (stale-if-error) when every provider fails.
+        """
+        symbol = self.format_symbol(symbol)
+
+        # Special handling for cash
+        if symbol.upper() == 'CASH':
+            return 1.0
+
+        cached_price = self._cached_price(symbol)
+        if cached_price is not None:
+            return cached_price
+
         try:
-            symbol = self._format_symbol(symbol)
-            print(f"Attempting to fetch price for: {symbol}")
-            
-            # Special handling for cash
-            if symbol.upper() == 'CASH':
-                return 1.0
-            
-            # Method 1: Try direct Yahoo Finance query API
-            try:
-                print(f"Trying Yahoo Finance query API for {symbol}")
-                price = self._try_yahoo_query_api(symbol)
-                if price:
-                    print(f"Yahoo query API successful for {symbol}: ${price}")
-                    return price
-            except Exception as e:
-                print(f"Yahoo query API failed for {symbol}: {e}")
-            
-            # Method 2: Try free FMP API
-            try:
-                print(f"Trying Financial Modeling Prep API for {symbol}")
-                price = self._try_fmp_api(symbol)
-                if price:
-                    print(f"FMP API successful for {symbol}: ${price}")
-                    return price
-            except Exception as e:
-                print(f"FMP API failed for {symbol}: {e}")
-            
-            # Method 3: Try IEX Cloud free API
-            try:
-                print(f"Trying IEX Cloud API for {symbol}")
-                price = self._try_iex_api(symbol)
-                if price:
-                    print(f"IEX API successful for {symbol}: ${price}")
-                    return price
-            except Exception as e:
-                print(f"IEX API failed for {symbol}: {e}")
-            
-            # Method 4: Try yfinance with session (if available)
-            if YFINANCE_AVAILABLE:
-                try:
-                    print(f"Trying yfinance with session for {symbol}")
-                    ticker = yf.Ticker(symbol, session=self.session)
-                    hist = ticker.history(period="1d", interval="1d")
-                    if not hist.empty:
-                        price = float(hist['Close'].iloc[-1])
-                        print(f"yfinance successful for {symbol}: ${price}")
-                        return price
-                except Exception as e:
-                    print(f"yfinance failed for {symbol}: {e}")
-                
-                # Method 5: Try alternative period
-                try:
-                    print(f"Trying yfinance alternative period for {symbol}")
-                    ticker = yf.Ticker(symbol, session=self.session)
-                    hist = ticker.history(period="5d")
-                    if not hist.empty:
-                        price = float(hist['Close'].iloc[-1])
-                        print(f"yfinance (5d) successful for {symbol}: ${price}")
-                        return price
-                except Exception as e:
-                    print(f"yfinance (5d) failed for {symbol}: {e}")
-            else:
-                print(f"yfinance not available, skipping for {symbol}")
-            
-            raise MarketDataError(f"All methods failed for {symbol}")
-            
+            price, source = self._fetch_price(symbol)
         except MarketDataError:
+            stale_price = self.stale_price_on_error(symbol)
+            if stale_price is not None:
+                return stale_price
             raise
+
+        self._cache.set(symbol, price, source)
+        return price
+
+    # Cache and symbol helpers shared with AsyncMarketDataService, so both services apply the same rules
+
+    @property
+    def cache(self) -> QuoteCache:
+        return self._cache
+
+    def cache_lookup(self, symbol: str) -> Tuple[Optional[float], bool]:
+        """Usable cached price for a provider symbol (or None), and whether it is stale and due a revalidation"""
+        quote = self._cache.get(symbol)
+        if quote is None:
+            return None, False
+
+        now = time.time()
+        if self._cache.is_fresh(quote, now):
+            return quote.price, False
+        if self._cache.can_revalidate(quote, now):
+            return quote.price, True
+        return None, False
+
+    def stale_price_on_error(self, symbol: str) -> Optional[float]:
+        """Expired price still served for a provider symbol when every provider fails (stale-if-error)"""
+        quote = self._cache.get(symbol)
+        if quote is None or not self._cache.can_serve_on_error(quote):
+            return None
+        logger.warning("Serving stale price for %s (%.0fs old)", symbol, quote.age(),
+                       extra={"event": "stale_if_error", "symbol": symbol})
+        return quote.price
+
+    def group_provider_symbols(self, symbols: List[str]) -> Tuple[Dict[str, float], Dict[str, List[str]]]:
+        """Split symbols into cash (priced at 1.0) and provider symbols mapped back to every symbol that formats to them"""
+        cash = {}
+        requested: Dict[str, List[str]] = {}
+        for symbol in dict.fromkeys(symbols):
+            if symbol.upper() == 'CASH':
+                cash[symbol] = 1.0
+                continue
+            requested.setdefault(self.format_symbol(symbol), []).append(symbol)
+        return cash, requested
+
+    def batch_chunks(self, provider_symbols: List[str]) -> List[List[str]]:
+        """Provider symbols packed into multi-symbol quote requests of settings.quote_batch_size"""
+        batch_size = max(1, settings.quote_batch_size)
+        return [provider_symbols[i:i + batch_size] for i in range(0, len(provider_symbols), batch_size)]
+
+    def store_batch_quotes(self, quotes: Dict[str, float], requested: Dict[str, List[str]], prices: Dict[str, float]):
+        """Cache batch quotes and fan each one back out to the requested symbols it prices"""
+        for provider_symbol, price in quotes.items():
+            self._cache.set(provider_symbol, price, "yahoo-batch")
+            for symbol in requested.get(provider_symbol, []):
+                prices[symbol] = price
+
+    def remember_fallback(self, symbol: str) -> float:
+        """Fallback price for a symbol no provider could price, served without retrying for settings.cache_miss_ttl"""
+        price = self.fallback_price(symbol)
+        now = time.time()
+        with self._misses_lock:
+            if len(self._misses) >= self._cache.max_size:
+                self._misses = {s: miss for s, miss in self._misses.items() if miss[0] > now}
+            self._misses[symbol] = (now + settings.cache_miss_ttl, price)
+        return price
+
+    def recent_fallback(self, symbol: str) -> Optional[float]:
+        """Fallback price remembered for a recent miss, or None once it has expired"""
+        with self._misses_lock:
+            miss = self._misses.get(symbol)
+        if miss is None or miss[0] <= time.time():
+            return None
+        return miss[1]
+
+    def quote_source(self, symbol: str) -> str:
+        """Where the cached price for a symbol came from ("cash" when nothing is cached)"""
+        quote = self._cache.get(self.format_symbol(symbol))
+        return quote.source if quote is not None else "cash"
+
+    def _cached_price(self, symbol: str, stale: Optional[List[str]] = None) -> Optional[float]:
+        """Return a usable cached price for a provider symbol, revalidating stale entries.
+
+        Stale entries are refreshed on their own background thread, unless a
+        `stale` list is passed: then they are appended to it so the caller can
+        revalidate them all in one batch.
+        """
+        price, needs_revalidation = self.cache_lookup(symbol)
+        if needs_revalidation:
+            if stale is None:
+                self._refresh_in_background(symbol)
+            else:
+                stale.append(symbol)
+        return price
+
+    def _claim_refresh(self, symbols: List[str]) -> List[str]:
+        """Mark symbols as being refreshed, returning those no other refresh already holds"""
+        with self._refreshing_lock:
+            claimed = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._refreshing]
+            self._refreshing.update(claimed)
+        return claimed
+
+    def _refresh_in_background(self, symbol: str):
+        # Only one background refresh per symbol at a time
+        if not self._claim_refresh([symbol]):
+            return
+
+        thread = threading.Thread(target=self._revalidate, args=(symbol,), name=f"revalidate-{symbol}", daemon=True)
+        thread.start()
+
+    def _revalidate(self, symbol: str):
+        try:
+            self._refetch(symbol)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(symbol)
+
+    def _refetch(self, symbol: str):
+        try:
+            price, source = self._fetch_price(symbol)
+            self._cache.set(symbol, price, source)
+        except MarketDataError as e:
+            logger.warning("Background refresh failed for %s: %s", symbol, e)
+
+    def _refresh_batch_in_background(self, symbols: List[str]):
+        """Revalidate many stale symbols on one background thread"""
+        symbols = self._claim_refresh(symbols)
+        if not symbols:
+            return
+
+        thread = threading.Thread(target=self._revalidate_batch, args=(symbols,), name="revalidate-batch", daemon=True)
+        thread.start()
+
+    def _revalidate_batch(self, symbols: List[str]):
+        # One batched quote request, then only its misses on the bounded worker pool
+        try:
+            priced = self.get_quotes_batch(symbols)
+            missing = [symbol for symbol in symbols if symbol not in priced]
+            if missing:
+                workers = max(1, min(settings.max_price_workers, len(missing)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-data-revalidate") as executor:
+                    list(executor.map(self._refetch, missing))
         except Exception as e:
-            print(f"Unexpected error for {symbol}: {e}")
-            raise MarketDataError(f"Error fetching {symbol}: {str(e)}")
-    
-    def _try_iex_api(self, symbol: str) -> float:
-        """Try IEX Cloud free tier API"""
+            logger.warning("Background refresh failed for %d symbols: %s", len(symbols), e)
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.difference_update(symbols)
+
+    def _providers(self) -> Dict[str, Callable[[str], Optional[float]]]:
+        """Per-symbol price providers in their default fallback order"""
+        providers = {
+            "yahoo": self._try_yahoo_query_api,
+            "fmp": self._try_fmp_api,
+            "iex": self._try_iex_api,
+        }
+        if YFINANCE_AVAILABLE:
+            providers["yfinance"] = self._try_yfinance
+        return providers
+
+    def _fetch_price(self, symbol: str) -> Tuple[float, str]:
+        """Walk the provider chain for a formatted symbol, returning the price and its source.
+
+        Providers are tried fastest-healthy first and providers whose circuit
+        is open are skipped until their cool-down has passed.
+        """
+        logger.debug("Fetching price for %s", symbol)
+        providers = self._providers()
+
+        if settings.hedged_requests:
+            return self._fetch_price_hedged(symbol, providers)
+
+        for provider in self.health.available(providers):
+            price = self._call_provider(provider, providers[provider], symbol)
+            if price:
+                logger.debug("%s priced %s at %s", provider, symbol, price)
+                return price, provider
+
+        raise MarketDataError(f"All methods failed for {symbol}")
+
+    def _fetch_price_hedged(self, symbol: str, providers: Dict[str, Callable[[str], Optional[float]]]) -> Tuple[float, str]:
+        """Hedged variant of the provider chain: first valid price wins.
+
+        The best provider is called first. If it hasn't answered within
+        settings.hedge_delay the next one is fired alongside it, up to
+        settings.hedge_max_parallel in flight, and a provider that comes back
+        empty is replaced straight away. Losers still queued are cancelled; ones
+        already running finish in the background and only update health stats.
+        """
+        executor = self._get_hedge_executor()
+        queue = self.health.available(providers)
+        pending = {}
+
+        def launch_next() -> bool:
+            for provider in queue:
+                future = executor.submit(self._call_provider, provider, providers[provider], symbol)
+                pending[future] = provider
+                return True
+            return False
+
+        exhausted = not launch_next()
+        while pending:
+            can_hedge = not exhausted and len(pending) < settings.hedge_max_parallel
+            done, _ = wait(list(pending), timeout=settings.hedge_delay if can_hedge else None, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Current providers are slow: hedge with the next one
+                exhausted = not launch_next()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                price = future.result()
+                if price:
+                    for loser, loser_provider in pending.items():
+                        # A loser cancelled before it started never reports back, so free any trial it claimed
+                        if loser.cancel():
+                            self.health.release(loser_provider)
+                    logger.debug("%s won hedged request for %s at %s", provider, symbol, price)
+                    return price, provider
+
+            # Move on to the next provider straight away when one comes back empty
+            if not exhausted:
+                exhausted = not launch_next()
+
+        raise MarketDataError(f"All methods failed for {symbol}")
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        with self._hedge_executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.max_price_workers * settings.hedge_max_parallel),
+                    thread_name_prefix="market-data-hedge",
+                )
+            return self._hedge_executor
+
+    def _call_provider(self, provider: str, fetch: Callable[[str], Optional[float]], symbol: str) -> Optional[float]:
+        """Call one provider and record the outcome in its health stats"""
+        start = time.monotonic()
         try:
-            # IEX Cloud has a free tier
-            url = f"https://cloud.iexapis.com/stable/stock/{symbol}/quote?token=demo"
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if 'latestPrice' in data:
-                return float(data['latestPrice'])
-            
-            return None
+            price = fetch(symbol)
         except Exception as e:
-            print(f"IEX API error for {symbol}: {e}")
+            self.health.record_error(provider, time.monotonic() - start, e)
+            logger.debug("%s failed for %s: %s", provider, symbol, e)
             return None
+
+        # An answer without a price keeps the circuit closed but counts against the provider's ranking
+        self.health.record_success(provider, time.monotonic() - start, priced=bool(price))
+        return price
+
+    def provider_health(self) -> Dict[str, Dict]:
+        """Health and circuit state of every provider, for diagnostics"""
+        return self.health.snapshot()
+
+    def _try_iex_api(self, symbol: str) -> Optional[float]:
+        """Try IEX Cloud free tier API"""
+        self.rate_limiter.acquire("iex")
+        response = self.session.get(IEX_QUOTE_URL.format(symbol=symbol), timeout=10)
+        response.raise_for_status()
+        return parse_iex_quote(response.json())
     
-    def _try_fmp_api(self, symbol: str) -> float:
+    def _try_fmp_api(self, symbol: str) -> Optional[float]:
         """Try Financial Modeling Prep API (free tier, no API key needed for basic quotes)"""
-        try:
-            # FMP has free tier with limited calls per day
-            url = f"https://financialmodelingprep.com/api/v3/quote-short/{symbol}"
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data and len(data) > 0 and 'price' in data[0]:
-                return float(data[0]['price'])
-            
-            return None
-        except Exception as e:
-            print(f"FMP API error for {symbol}: {e}")
-            return None
+        self.rate_limiter.acquire("fmp")
+        response = self.session.get(FMP_QUOTE_URL.format(symbol=symbol), timeout=10)
+        response.raise_for_status()
+        return parse_fmp_quote(response.json())
     
-    def _try_yahoo_query_api(self, symbol: str) -> float:
+    def _try_yahoo_query_api(self, symbol: str) -> Optional[float]:
         """Try Yahoo Finance query API directly"""
+        self.rate_limiter.acquire("yahoo")
+        response = self.session.get(YAHOO_CHART_URL.format(symbol=symbol), headers=YAHOO_HEADERS, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        price = parse_yahoo_chart(data)
+        self.keep_chart_bars(symbol, data)
+        return price
+
+    @property
+    def history(self):
+        """Local close history, or None when price_history_dir isn't configured"""
+        if self._history is None and settings.price_history_dir:
+            # Imported here so numpy only loads once history is actually used
+            from .price_history import PriceHistory
+            self._history = PriceHistory(settings.price_history_dir)
+        return self._history
+
+    def keep_chart_bars(self, symbol: str, data: Dict):
+        """Fold the bars a price lookup already downloaded into symbols that have stored history.
+
+        The bars are a by-product of the lookup, so history errors (disk, a
+        corrupt file) are logged here and never cost the lookup its price or
+        count against the provider.
+        """
         try:
-            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = self.session.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data.get('chart', {}).get('result'):
-                result = data['chart']['result'][0]
-                if result.get('meta', {}).get('regularMarketPrice'):
-                    return float(result['meta']['regularMarketPrice'])
-                
-                # Try getting from indicators
-                indicators = result.get('indicators', {})
-                if indicators.get('quote') and indicators['quote'][0].get('close'):
-                    closes = [x for x in indicators['quote'][0]['close'] if x is not None]
-                    if closes:
-                        return float(closes[-1])
-            
-            return None
+            history = self.history
+            if history is None:
+                return
+            interval = (data.get('chart', {}).get('result') or [{}])[0].get('meta', {}).get('dataGranularity')
+            # Only extend existing series; starting one here would make backfill skip the older bars
+            if interval not in ("1d", "1h", "5m") or history.last_timestamp(symbol, interval) is None:
+                return
+            timestamps, closes = parse_yahoo_chart_history(data)
+            history.merge(symbol, timestamps, closes, interval)
         except Exception as e:
-            print(f"Yahoo query API error for {symbol}: {e}")
-            return None
-            raise MarketDataError(f"Error fetching {symbol}: {str(e)}")
+            logger.warning("Could not store chart bars for %s: %s", symbol, e,
+                           extra={"event": "history_merge_failed", "symbol": symbol})
+
+    def backfill_history(self, symbol: str, interval: str = "1d") -> int:
+        """Fetch bars newer than the last stored one (or the full lookback the first time).
+
+        The last stored bar is requested again so a bar that was still forming
+        gets its final close. Returns the number of new bars stored.
+        """
+        from .price_history import INTERVAL_SECONDS
+
+        history = self.history
+        if history is None:
+            raise MarketDataError("Price history is not configured (set PRICE_HISTORY_DIR)")
+        symbol = self.format_symbol(symbol)
+        now = int(time.time())
+
+        # Don't go back to the provider more than once per bar
+        checked = self._history_checked.get((symbol, interval))
+        if checked is not None and now - checked < INTERVAL_SECONDS[interval]:
+            return 0
 
-    def _format_symbol(self, symbol: str) -> str:
+        last = history.last_timestamp(symbol, interval)
+        lookback_days = settings.history_backfill_days if interval == "1d" else HISTORY_INTRADAY_LOOKBACK_DAYS[interval]
+        period1 = last if last is not None else now - lookback_days * 86400
+
+        self.rate_limiter.acquire("yahoo")
+        response = self.session.get(
+            YAHOO_CHART_URL.format(symbol=symbol),
+            params={'period1': period1, 'period2': now, 'interval': interval},
+            headers=YAHOO_HEADERS, timeout=10,
+        )
+        response.raise_for_status()
+        timestamps, closes = parse_yahoo_chart_history(response.json())
+        added = history.merge(symbol, timestamps, closes, interval)
+
+        self._history_checked[(symbol, interval)] = now
+        logger.info("Backfilled %d %s bars for %s", added, interval, symbol,
+                    extra={"event": "history_backfill", "symbol": symbol, "interval": interval, "bars": added})
+        return added
+
+    def get_history(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+                    interval: str = "1d"):
+        """Stored bars between start and end (unix seconds), backfilling new ones first.
+
+        If the provider is unavailable, whatever history is already stored is returned.
+        """
+        try:
+            self.backfill_history(symbol, interval)
+        except (requests.RequestException, MarketDataError) as e:
+            if self.history is None:
+                raise
+            logger.warning("History backfill failed for %s: %s", symbol, e)
+        return self.history.range(self.format_symbol(symbol), start, end, interval)
+
+    def _try_yfinance(self, symbol: str) -> Optional[float]:
+        """Try yfinance with session, then with a longer period"""
+        for kwargs in ({"period": "1d", "interval": "1d"}, {"period": "5d"}):
+            self.rate_limiter.acquire("yfinance")
+            ticker = _yfinance().Ticker(symbol, session=self.session)
+            hist = ticker.history(**kwargs)
+            if not hist.empty:
+                return float(hist['Close'].iloc[-1])
+        return None
+
+    def _try_yahoo_quote_batch(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetch several symbols from Yahoo Finance's quote endpoint in one request"""
+        self.rate_limiter.acquire("yahoo")
+        response = self.session.get(YAHOO_QUOTE_URL, params={'symbols': ','.join(symbols)}, headers=YAHOO_HEADERS, timeout=10)
+        response.raise_for_status()
+        return parse_yahoo_quotes(response.json())
+
+    def format_symbol(self, symbol: str) -> str:
         """Format symbol for API request"""
         if self._is_crypto(symbol) and not symbol.endswith('-USD'):
             return f"{symbol}-USD"
@@ -186,76 +552,142 @@ class MarketDataService:
         # Check if it's a known crypto symbol or already ends with -USD
         return symbol in crypto_symbols or symbol.endswith('-USD') or symbol.endswith('USDT')
 
-    def get_multiple_prices(self, symbols: List[str]) -> Dict[str, float]:
+    # Updated mock prices for common symbols
+    MOCK_PRICES = {
+        'FSKAX': 180.50,    # Fidelity Total Stock Market Index
+        'FTIHX': 35.25,     # Fidelity Total International Index  
+        'FXNAX': 12.85,     # Fidelity Bond Index
+        'CASH': 1.0,        # Cash position
+        'NVDA': 875.00,     # NVIDIA
+        'AAPL': 190.00,     # Apple
+        'MSFT': 420.00,     # Microsoft
+        'GOOGL': 145.00,    # Google
+        'AMZN': 150.00,     # Amazon
+        'TSLA': 250.00,     # Tesla
+        'SPY': 445.00,      # S&P 500 ETF
+        'QQQ': 385.00,      # NASDAQ 100 ETF
+        'VTI': 265.00,      # Vanguard Total Stock Market
+        'VOO': 435.00,      # Vanguard S&P 500
+        'BTC-USD': 67000.00,    # Bitcoin
+        'ETH-USD': 3500.00,     # Ethereum
+        'XRP-USD': 0.55,        # Ripple
+        'ADA-USD': 0.45,        # Cardano
+        'SOL-USD': 180.00,      # Solana
+    }
+
+    def get_multiple_prices(self, symbols: List[str], max_workers: Optional[int] = None) -> Dict[str, float]:
+        """Fetch prices for many symbols concurrently.
+
+        Duplicate symbols (e.g. the same ticker held at several brokers) are only
+        fetched once, and the unique symbols are spread over a bounded worker pool.
+        Workers share the per-provider token buckets, so each provider's quota still holds.
+        """
+        started = time.monotonic()
+        unique_symbols = list(dict.fromkeys(symbols))
+        if not unique_symbols:
+            return {}
+
         prices = {}
-        
-        # Updated mock prices for common symbols
-        mock_prices = {
-            'FSKAX': 180.50,    # Fidelity Total Stock Market Index
-            'FTIHX': 35.25,     # Fidelity Total International Index  
-            'FXNAX': 12.85,     # Fidelity Bond Index
-            'CASH': 1.0,        # Cash position
-            'NVDA': 875.00,     # NVIDIA
-            'AAPL': 190.00,     # Apple
-            'MSFT': 420.00,     # Microsoft
-            'GOOGL': 145.00,    # Google
-            'AMZN': 150.00,     # Amazon
-            'TSLA': 250.00,     # Tesla
-            'SPY': 445.00,      # S&P 500 ETF
-            'QQQ': 385.00,      # NASDAQ 100 ETF
-            'VTI': 265.00,      # Vanguard Total Stock Market
-            'VOO': 435.00,      # Vanguard S&P 500
-            'BTC-USD': 67000.00,    # Bitcoin
-            'ETH-USD': 3500.00,     # Ethereum
-            'XRP-USD': 0.55,        # Ripple
-            'ADA-USD': 0.45,        # Cardano
-            'SOL-USD': 180.00,      # Solana
-        }
-        
-        print(f"Processing {len(symbols)} symbols: {symbols}")
-        
-        for symbol in symbols:
-            symbol_upper = symbol.upper()
-            
-            # Try real API first with timeout
+        sources = {}
+        stale = []
+        for symbol in unique_symbols:
+            cached_price = self._cached_price(self.format_symbol(symbol), stale)
+            if cached_price is not None:
+                prices[symbol] = cached_price
+                sources[symbol] = "cache"
+                continue
+            # Symbols nobody could price a moment ago aren't walked through every provider again
+            fallback = self.recent_fallback(symbol)
+            if fallback is not None:
+                prices[symbol] = fallback
+                sources[symbol] = "fallback"
+        if stale:
+            # Stale prices are served now and revalidated together, not one thread per symbol
+            self._refresh_batch_in_background(stale)
+        uncached = [symbol for symbol in unique_symbols if symbol not in prices]
+
+        # One batched quote request covers most symbols; only misses go through the provider chain
+        if uncached:
+            batch_prices = self.get_quotes_batch(uncached)
+            prices.update(batch_prices)
+            sources.update((symbol, "yahoo-batch") for symbol in batch_prices)
+        missing = [symbol for symbol in unique_symbols if symbol not in prices]
+
+        if missing:
+            workers = max(1, min(max_workers or settings.max_price_workers, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="market-data") as executor:
+                for symbol, (price, source) in zip(missing, executor.map(self._get_price_or_fallback, missing)):
+                    prices[symbol] = price
+                    sources[symbol] = source
+
+        log_price_refresh(logger, len(symbols), sources, started)
+        return {symbol: prices[symbol] for symbol in unique_symbols}
+
+    def get_quotes_batch(self, symbols: List[str]) -> Dict[str, float]:
+        """Fetch quotes for many symbols with as few HTTP requests as possible.
+
+        Symbols are packed into chunks of settings.quote_batch_size and sent to
+        Yahoo's multi-symbol quote endpoint. The result only contains the symbols
+        the batch could price; callers fall back to get_price for the rest.
+        """
+        prices, requested = self.group_provider_symbols(symbols)
+        for chunk in self.batch_chunks(list(requested)):
+            if not self.health.allow("yahoo"):
+                logger.debug("Skipping Yahoo batch quote for %d symbols: circuit open", len(chunk))
+                break
+
+            start = time.monotonic()
             try:
-                print(f"Attempting real API for {symbol}")
-                price = self.get_price(symbol)
-                prices[symbol] = price
-                print(f"✅ Real API success for {symbol}: ${price}")
+                quotes = self._try_yahoo_quote_batch(chunk)
+            except Exception as e:
+                self.health.record_error("yahoo", time.monotonic() - start, e)
+                logger.warning("Yahoo batch quote failed for %d symbols: %s", len(chunk), e)
                 continue
-            except MarketDataError as e:
-                print(f"❌ Real API failed for {symbol}: {str(e)}")
-            
-            # Fall back to mock prices
-            if symbol in mock_prices:
-                prices[symbol] = mock_prices[symbol]
-                print(f"📦 Using mock price for {symbol}: ${mock_prices[symbol]}")
-            elif symbol_upper in mock_prices:
-                prices[symbol] = mock_prices[symbol_upper]
-                print(f"📦 Using mock price for {symbol_upper}: ${mock_prices[symbol_upper]}")
-            else:
-                # Special cases
-                if symbol_upper == 'CASH':
-                    prices[symbol] = 1.0
-                    print(f"💵 Using cash price for {symbol}: $1.00")
-                else:
-                    # Use a reasonable fallback based on symbol type
-                    if symbol_upper.endswith('-USD'):  # Crypto
-                        prices[symbol] = 50.00
-                        print(f"🪙 Using crypto fallback for {symbol}: $50.00")
-                    elif len(symbol) == 5 and symbol.endswith('X'):  # Mutual fund
-                        prices[symbol] = 25.00
-                        print(f"🏦 Using mutual fund fallback for {symbol}: $25.00")
-                    elif len(symbol) <= 4:  # Likely stock
-                        prices[symbol] = 100.00
-                        print(f"📈 Using stock fallback for {symbol}: $100.00")
-                    else:
-                        prices[symbol] = 50.00
-                        print(f"❓ Using generic fallback for {symbol}: $50.00")
-        
-        print(f"Final prices: {prices}")
+            # A batch that priced nothing counts against Yahoo's ranking like an empty single quote
+            self.health.record_success("yahoo", time.monotonic() - start, priced=bool(quotes))
+            self.store_batch_quotes(quotes, requested, prices)
+
+        logger.debug("Batch quotes priced %d of %d symbols", len(prices), len(symbols))
         return prices
 
+    def _get_price_or_fallback(self, symbol: str) -> Tuple[float, str]:
+        """Fetch a single price and its source, falling back to mock prices if every provider fails"""
+        # Try real API first with timeout
+        try:
+            price = self.get_price(symbol)
+            return price, self.quote_source(symbol)
+        except MarketDataError as e:
+            logger.debug("Real API failed for %s: %s", symbol, e)
+        
+        return self.remember_fallback(symbol), "fallback"
+
+    def fallback_price(self, symbol: str) -> float:
+        """Mock or heuristic price used when no provider (or cache) can price a symbol"""
+        symbol_upper = symbol.upper()
+
+        # Fall back to mock prices
+        if symbol in self.MOCK_PRICES:
+            price = self.MOCK_PRICES[symbol]
+        elif symbol_upper in self.MOCK_PRICES:
+            price = self.MOCK_PRICES[symbol_upper]
+        # Special cases
+        elif symbol_upper == 'CASH':
+            price = 1.0
+        # Use a reasonable fallback based on symbol type
+        elif symbol_upper.endswith('-USD'):  # Crypto
+            price = 50.00
+        elif len(symbol) == 5 and symbol.endswith('X'):  # Mutual fund
+            price = 25.00
+        elif len(symbol) <= 4:  # Likely stock
+            price = 100.00
+        else:
+            price = 50.00
+
+        logger.warning("Using fallback price for %s: %s", symbol, price,
+                       extra={"event": "price_fallback", "symbol": symbol})
+        return price
+
     def clear_cache(self):
-        self.get_price.cache_clear()
\ No newline at end of file
+        self._cache.clear()
+        with self._misses_lock:
+            self._misses.clear()
\ No newline at end of file
@@ -0,0 +1,103 @@
+# On-disk store of historical closes, one memory-mapped NumPy file per symbol and interval
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+import threading
+import numpy as np
+
+# One bar: bar start time (UTC, seconds) and close
+BAR_DTYPE = np.dtype([("ts", "M8[s]"), ("close", "f8")])
+
+# Bar length in seconds for each supported interval
+INTERVAL_SECONDS = {"1d": 86400, "1h": 3600, "5m": 300}
+
+class PriceHistory:
+    """Close series per (symbol, interval), stored as sorted structured arrays in .npy files.
+
+    Reads memory-map the file, so range queries only touch the pages they
+    slice. Writes merge new bars in and atomically replace the file, so a
+    reader never sees a half-written series.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, symbol: str, interval: str) -> Path:
+        if interval not in INTERVAL_SECONDS:
+            raise ValueError(f"Unsupported interval: {interval}")
+        # Symbols like BTC-USD or ^GSPC are fine in filenames once slashes are gone
+        return self.directory / f"{symbol.replace('/', '_')}.{interval}.npy"
+
+    def load(self, symbol: str, interval: str = "1d") -> np.ndarray:
+        """Every stored bar, oldest first (read-only, memory-mapped)"""
+        path = self._path(symbol, interval)
+        if not path.exists():
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.load(path, mmap_mode="r")
+
+    def last_timestamp(self, symbol: str, interval: str = "1d") -> Optional[int]:
+        """Unix time of the newest stored bar, or None when nothing is stored"""
+        bars = self.load(symbol, interval)
+        if len(bars) == 0:
+            return None
+        return int(bars["ts"][-1].astype("int64"))
+
+    def merge(self, symbol: str, timestamps: Sequence[int], closes: Sequence[float], interval: str = "1d") -> int:
+        """Merge bars into the stored series, returning how many were new.
+
+        Incoming bars replace stored bars from the first incoming timestamp
+        on, so re-fetching the latest (still forming) bar updates it in place.
+        """
+        incoming = np.empty(len(timestamps), dtype=BAR_DTYPE)
+        incoming["ts"] = np.asarray(timestamps, dtype="int64").astype("M8[s]")
+        incoming["close"] = np.asarray(closes, dtype="f8")
+        incoming = incoming[~np.isnan(incoming["close"])]
+        if len(incoming) == 0:
+            return 0
+        incoming = incoming[np.argsort(incoming["ts"], kind="stable")]
+
+        path = self._path(symbol, interval)
+        with self._lock:
+            existing = self.load(symbol, interval)
+            keep = int(np.searchsorted(existing["ts"], incoming["ts"][0], side="left"))
+            merged = np.concatenate([existing[:keep], incoming])
+
+            tmp_path = path.with_suffix(".tmp.npy")
+            np.save(tmp_path, merged)
+            os.replace(tmp_path, path)
+        return len(merged) - len(existing)
+
+    def range(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+              interval: str = "1d") -> np.ndarray:
+        """Bars with start <= ts <= end (unix seconds; either bound may be open)"""
+        bars = self.load(symbol, interval)
+        ts = bars["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, np.datetime64(int(start), "s"), side="left"))
+        hi = len(bars) if end is None else int(np.searchsorted(ts, np.datetime64(int(end), "s"), side="right"))
+        return bars[lo:hi]
+
+    def aligned(self, symbols: List[str], start: Optional[int] = None, end: Optional[int] = None,
+                interval: str = "1d") -> Tuple[np.ndarray, np.ndarray]:
+        """Closes for several symbols on one shared timeline.
+
+        Returns (timestamps, closes) where closes has one column per symbol.
+        Gaps (e.g. a stock on a weekend next to a crypto) carry the previous
+        close forward; cells before a symbol's first bar are NaN.
+        """
+        series: Dict[str, np.ndarray] = {symbol: self.range(symbol, start, end, interval) for symbol in symbols}
+        if not series or all(len(bars) == 0 for bars in series.values()):
+            return np.empty(0, dtype="M8[s]"), np.empty((0, len(symbols)))
+        timeline = np.unique(np.concatenate([bars["ts"] for bars in series.values()]))
+
+        closes = np.full((len(timeline), len(symbols)), np.nan)
+        for column, symbol in enumerate(symbols):
+            bars = series[symbol]
+            if len(bars) == 0:
+                continue
+            # Index of the latest bar at or before each timeline point
+            index = np.searchsorted(bars["ts"], timeline, side="right") - 1
+            valid = index >= 0
+            closes[valid, column] = bars["close"][index[valid]]
+        return timeline, closes
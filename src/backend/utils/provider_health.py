@@ -0,0 +1,176 @@
+# Provider health tracking and circuit breaking for the market data chain
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+import threading
+import time
+
+def is_not_found(error: Exception) -> bool:
+    """Whether an HTTP error (requests or httpx) is a 404: the provider answered, it just has no data"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 404
+
+class ProviderHealth:
+    """Rolling success rate, price hit rate and latency for one provider, plus its circuit state"""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.samples = deque(maxlen=window)  # (success, latency, priced) per call
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.total_calls = 0
+        self.total_failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def success_rate(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(1 for ok, _, _ in self.samples if ok) / len(self.samples)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """Share of calls that actually returned a price"""
+        if not self.samples:
+            return None
+        return sum(1 for _, _, priced in self.samples if priced) / len(self.samples)
+
+    @property
+    def avg_latency(self) -> Optional[float]:
+        if not self.samples:
+            return None
+        return sum(latency for _, latency, _ in self.samples) / len(self.samples)
+
+    def state(self, now: float) -> str:
+        if self.open_until > now:
+            return "open"
+        if self.open_until:
+            return "half_open"
+        return "closed"
+
+    def score(self) -> float:
+        """Expected seconds per returned price; lower is better.
+
+        A provider that answers quickly but without a price (e.g. an empty
+        list) doesn't trip the circuit, but it doesn't rank as fast either.
+        """
+        if not self.samples or not self.hit_rate:
+            return float("inf")
+        return self.avg_latency / self.hit_rate
+
+class ProviderHealthRegistry:
+    """Tracks every provider and decides which ones the fallback chain may call.
+
+    After `failure_threshold` consecutive failures a provider's circuit opens and
+    it is skipped for `cooldown` seconds. Once the cool-down passes a single
+    trial call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0, window: int = 50):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self._providers: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider: str) -> ProviderHealth:
+        health = self._providers.get(provider)
+        if health is None:
+            health = self._providers[provider] = ProviderHealth(provider, self.window)
+        return health
+
+    def allow(self, provider: str) -> bool:
+        """Whether the provider may be called now; claims the half-open trial if due"""
+        now = time.time()
+        with self._lock:
+            health = self._get(provider)
+            state = health.state(now)
+            if state == "closed":
+                return True
+            if state == "half_open" and not health.probing:
+                health.probing = True
+                return True
+            return False
+
+    def release(self, provider: str):
+        """Give back a half-open trial claimed by allow() whose call never ran to completion.
+
+        Nothing is recorded, so the next caller gets the trial instead.
+        """
+        with self._lock:
+            health = self._get(provider)
+            if health.state(time.time()) == "half_open":
+                health.probing = False
+
+    def available(self, providers: Iterable[str]) -> Iterator[str]:
+        """Providers in ranked order that may be called now.
+
+        Lazy, so a half-open trial is only claimed once the caller actually
+        reaches that provider.
+        """
+        for provider in self.order(providers):
+            if self.allow(provider):
+                yield provider
+
+    def record_success(self, provider: str, latency: float, priced: bool = True):
+        """Record a call the provider answered; `priced` is False when the answer held no price"""
+        with self._lock:
+            health = self._get(provider)
+            health.samples.append((True, latency, priced))
+            health.total_calls += 1
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+            health.probing = False
+
+    def record_error(self, provider: str, latency: float, error: Exception):
+        """Record a call that raised: a 404 is an answer without a price, anything else a failure"""
+        if is_not_found(error):
+            self.record_success(provider, latency, priced=False)
+        else:
+            self.record_failure(provider, latency, str(error))
+
+    def record_failure(self, provider: str, latency: float, error: Optional[str] = None):
+        with self._lock:
+            health = self._get(provider)
+            health.samples.append((False, latency, False))
+            health.total_calls += 1
+            health.total_failures += 1
+            health.consecutive_failures += 1
+            health.last_error = error
+            health.probing = False
+            if health.consecutive_failures >= self.failure_threshold:
+                health.open_until = time.time() + self.cooldown
+
+    def order(self, providers: Iterable[str]) -> List[str]:
+        """Order providers fastest-healthy first, keeping the declared order for ties.
+
+        Providers without samples keep their declared position behind measured
+        ones, and providers with an open circuit go last.
+        """
+        now = time.time()
+        with self._lock:
+            ranked = []
+            for index, provider in enumerate(providers):
+                health = self._get(provider)
+                ranked.append((health.state(now) == "open", health.score(), index, provider))
+        return [provider for *_, provider in sorted(ranked)]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Health state of every provider, for diagnostics"""
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "state": health.state(now),
+                    "success_rate": health.success_rate,
+                    "hit_rate": health.hit_rate,
+                    "avg_latency_ms": round(health.avg_latency * 1000, 1) if health.avg_latency is not None else None,
+                    "consecutive_failures": health.consecutive_failures,
+                    "total_calls": health.total_calls,
+                    "total_failures": health.total_failures,
+                    "retry_in": round(max(0.0, health.open_until - now), 1),
+                    "last_error": health.last_error,
+                }
+                for name, health in self._providers.items()
+            }
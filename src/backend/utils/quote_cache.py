@@ -0,0 +1,117 @@
+# In-memory quote cache with TTL, LRU eviction and stale windows
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, TYPE_CHECKING
+import logging
+import sqlite3
+import threading
+import time
+
+if TYPE_CHECKING:
+    from .quote_store import QuoteStore
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CachedQuote:
+    price: float
+    fetched_at: float  # Unix timestamp of when the price was fetched
+    source: Optional[str] = None
+
+    def age(self, now: Optional[float] = None) -> float:
+        return (now if now is not None else time.time()) - self.fetched_at
+
+class QuoteCache:
+    """Thread-safe LRU cache of quotes keyed by provider symbol.
+
+    An entry is fresh for `ttl` seconds. After that it can still be served
+    immediately while a background refresh runs (stale-while-revalidate) for
+    another `stale_while_revalidate` seconds, and returned in place of an error
+    (stale-if-error) for `stale_if_error` seconds past its TTL.
+
+    The persistent store is best effort: if it can't be read or written
+    (locked, disk full, corrupt file) the cache logs it and keeps serving
+    from memory.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 500,
+                 stale_while_revalidate: float = 0, stale_if_error: float = 0,
+                 store: Optional["QuoteStore"] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.store = store
+        self._entries: "OrderedDict[str, CachedQuote]" = OrderedDict()
+        self._lock = threading.Lock()
+        if store is not None:
+            self._warm_start()
+
+    def _warm_start(self):
+        """Load the last known quotes from the persistent store, newest kept on overflow"""
+        try:
+            quotes = self.store.load(max_age=self.ttl + max(self.stale_while_revalidate, self.stale_if_error),
+                                     now=time.time())
+        except sqlite3.Error as e:
+            logger.warning("Quote store warm start failed: %s", e, extra={"event": "quote_store_failed"})
+            return
+        with self._lock:
+            for symbol, quote in quotes.items():
+                self._entries[symbol] = quote
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, symbol: str) -> Optional[CachedQuote]:
+        with self._lock:
+            quote = self._entries.get(symbol)
+            if quote is not None:
+                self._entries.move_to_end(symbol)
+            return quote
+
+    def set(self, symbol: str, price: float, source: Optional[str] = None,
+            fetched_at: Optional[float] = None) -> CachedQuote:
+        quote = CachedQuote(price=price, fetched_at=fetched_at if fetched_at is not None else time.time(), source=source)
+        with self._lock:
+            self._entries[symbol] = quote
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        if self.store is not None:
+            try:
+                self.store.save(symbol, quote)
+            except sqlite3.Error as e:
+                logger.warning("Quote store write failed for %s: %s", symbol, e,
+                               extra={"event": "quote_store_failed", "symbol": symbol})
+        return quote
+
+    def is_fresh(self, quote: CachedQuote, now: Optional[float] = None) -> bool:
+        return quote.age(now) <= self.ttl
+
+    def can_revalidate(self, quote: CachedQuote, now: Optional[float] = None) -> bool:
+        """Whether a stale quote may be served while it is refreshed in the background"""
+        return quote.age(now) <= self.ttl + self.stale_while_revalidate
+
+    def can_serve_on_error(self, quote: CachedQuote, now: Optional[float] = None) -> bool:
+        """Whether an expired quote may be served because every provider failed"""
+        return quote.age(now) <= self.ttl + self.stale_if_error
+
+    def snapshot(self) -> Dict[str, CachedQuote]:
+        with self._lock:
+            return dict(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            try:
+                self.store.clear()
+            except sqlite3.Error as e:
+                logger.warning("Quote store clear failed: %s", e, extra={"event": "quote_store_failed"})
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, symbol: str) -> bool:
+        with self._lock:
+            return symbol in self._entries
@@ -0,0 +1,62 @@
+# Persistent SQLite store backing the quote cache across restarts
+from pathlib import Path
+from typing import Dict, Optional
+import sqlite3
+import threading
+from .quote_cache import CachedQuote
+
+class QuoteStore:
+    """Last known quote per symbol, kept in a small SQLite file.
+
+    The quote cache writes through to the store and warm-starts from it, so a
+    fresh process can answer immediately with timestamped prices and only
+    refetch the ones that have gone stale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quotes ("
+                "symbol TEXT PRIMARY KEY, price REAL NOT NULL, fetched_at REAL NOT NULL, source TEXT)"
+            )
+            self._conn.commit()
+
+    def load(self, max_age: Optional[float] = None, now: Optional[float] = None) -> Dict[str, CachedQuote]:
+        """Load stored quotes, oldest first, optionally skipping ones older than max_age"""
+        query = "SELECT symbol, price, fetched_at, source FROM quotes"
+        params = ()
+        if max_age is not None and now is not None:
+            query += " WHERE fetched_at >= ?"
+            params = (now - max_age,)
+        query += " ORDER BY fetched_at"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return {
+            symbol: CachedQuote(price=price, fetched_at=fetched_at, source=source)
+            for symbol, price, fetched_at, source in rows
+        }
+
+    def save(self, symbol: str, quote: CachedQuote):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quotes (symbol, price, fetched_at, source) VALUES (?, ?, ?, ?)",
+                (symbol, quote.price, quote.fetched_at, quote.source),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM quotes")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
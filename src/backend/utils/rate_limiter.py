@@ -0,0 +1,106 @@
+# Per-provider token bucket rate limiting
+from typing import Dict, Tuple
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket refilling at `rate` tokens per second up to `capacity`.
+
+    Callers reserve tokens up front: the bucket may go negative, and the
+    returned wait is how long the caller must sleep before its reservation is
+    covered. The lock is only held for the arithmetic, so the same bucket can be
+    shared by worker threads and by coroutines on the event loop.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take tokens now and return the number of seconds to wait before using them"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def release(self, tokens: float = 1.0):
+        """Give back tokens reserved for a call that will not be made"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take tokens only if they are available right now"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # A cancelled caller never makes its request, so the callers queued behind it shouldn't wait for it
+                self.release(tokens)
+                raise
+
+class RateLimiter:
+    """Registry of token buckets, one per market data provider"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], default_rate: float = 1.0, default_burst: float = 1.0):
+        self._default = (default_rate, default_burst)
+        self._buckets: Dict[str, TokenBucket] = {
+            provider: TokenBucket(rate, burst) for provider, (rate, burst) in limits.items()
+        }
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "RateLimiter":
+        return cls(
+            {
+                "yahoo": (settings.yahoo_rate_limit, settings.yahoo_burst),
+                "fmp": (settings.fmp_rate_limit, settings.fmp_burst),
+                "iex": (settings.iex_rate_limit, settings.iex_burst),
+                "yfinance": (settings.yfinance_rate_limit, settings.yfinance_burst),
+            },
+            default_rate=1.0 / settings.rate_limit_delay if settings.rate_limit_delay > 0 else 1.0,
+        )
+
+    def bucket(self, provider: str) -> TokenBucket:
+        bucket = self._buckets.get(provider)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(provider)
+                if bucket is None:
+                    bucket = self._buckets[provider] = TokenBucket(*self._default)
+        return bucket
+
+    def acquire(self, provider: str, tokens: float = 1.0):
+        self.bucket(provider).acquire(tokens)
+
+    async def acquire_async(self, provider: str, tokens: float = 1.0):
+        await self.bucket(provider).acquire_async(tokens)
+
+    def try_acquire(self, provider: str, tokens: float = 1.0) -> bool:
+        return self.bucket(provider).try_acquire(tokens)
@@ -0,0 +1,40 @@
+# Coalesces concurrent async calls for the same key into one in-flight call
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """At most one in-flight call per key.
+
+    Callers that arrive while a call for their key is running await that same
+    call and receive its result (or its exception) instead of starting their
+    own. The key is released as soon as the call finishes, so the next caller
+    after that starts a fresh one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        # Shielded so one caller going away (e.g. a dropped request) doesn't cancel it for everyone
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def wait(self, key: Hashable):
+        """Wait for the call in flight for key, if any, to finish, without joining its result"""
+        task = self._calls.get(key)
+        if task is not None and not task.done():
+            await asyncio.wait([task])
+
+    def in_flight(self, key: Hashable) -> bool:
+        task = self._calls.get(key)
+        return task is not None and not task.done()
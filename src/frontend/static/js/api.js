@@ -88,6 +88,38 @@ const API = {
         return data;
     },
 
+    // Backend batch price endpoint (shared server-side cache)
+    PRICES_URL: '/api/prices',
+
+    // Get prices for many symbols from the backend in one request.
+    // Returns {} when no backend is serving this page, so callers fall back to direct lookups.
+    async getBackendPrices(symbols) {
+        const unique = [...new Set(symbols.filter(symbol => this.isValidSymbol(symbol)))];
+        if (unique.length === 0) {
+            return {};
+        }
+
+        try {
+            const response = await fetch(`${this.PRICES_URL}?symbols=${encodeURIComponent(unique.join(','))}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            const data = await response.json();
+            const prices = {};
+            for (const [symbol, quote] of Object.entries(data.quotes)) {
+                // Leave mock/heuristic backend prices to the client-side providers
+                if (quote.source !== 'fallback') {
+                    prices[symbol] = quote.price;
+                }
+            }
+            return prices;
+        } catch (error) {
+            console.warn('⚠️ Backend prices unavailable, fetching directly:', error.message);
+            return {};
+        }
+    },
+
     // Check if symbol is valid for price lookup
     isValidSymbol(symbol) {
         // Skip account types and invalid symbols - allow mutual funds like FSKAX, FTIHX
@@ -555,10 +587,12 @@ const API = {
                 return [];
             }
             
-            // Get current prices and calculate values using live market data
+            // Get current prices and calculate values using live market data,
+            // one backend request for the whole sheet before any per-symbol lookups
+            const backendPrices = await this.getBackendPrices(positions.map(p => p.symbol));
             for (let position of positions) {
                 // Always fetch current market price for real-time portfolio tracking
-                position.current_price = await this.getStockPrice(position.symbol);
+                position.current_price = backendPrices[position.symbol] ?? await this.getStockPrice(position.symbol);
                 position.current_value = position.shares * position.current_price;
                 position.cost_value = position.total_cost_basis; // Use the actual total cost from sheet
                 position.gain_loss = position.current_value - position.cost_value;
@@ -1,5 +1,7 @@
+import logging
 import pytest
 from src.backend.config import Settings
+from src.backend.utils.log_config import PACKAGE_LOGGER
 
 @pytest.fixture
 def test_settings():
@@ -12,6 +14,15 @@ def test_settings():
         kraken_range="Kraken!A2:C"
     )
 
+@pytest.fixture(autouse=True)
+def propagate_backend_logs():
+    """Let caplog see backend records even once the app has configured its own handler"""
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    propagate = logger.propagate
+    logger.propagate = True
+    yield
+    logger.propagate = propagate
+
 @pytest.fixture(autouse=True)
 def mock_sheets_client(monkeypatch):
     """Mock Google Sheets client for testing"""
@@ -35,4 +46,6 @@ def mock_sheets_client(monkeypatch):
         return []
 
     monkeypatch.setattr("src.backend.utils.google_auth.GoogleSheetsClient.read_range", 
-                       mock_read_range)
\ No newline at end of file
+                       mock_read_range)
+    monkeypatch.setattr("src.backend.utils.google_auth.GoogleSheetsClient.read_ranges",
+                       lambda self, range_names: {name: mock_read_range(name) for name in range_names})
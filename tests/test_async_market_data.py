@@ -0,0 +1,262 @@
+import pytest
+import asyncio
+import time
+import httpx
+from unittest.mock import patch
+from src.backend.utils.market_data import MarketDataService, MarketDataError
+from src.backend.utils.async_market_data import AsyncMarketDataService
+from src.backend.utils.rate_limiter import TokenBucket
+
+def make_service(handler):
+    return AsyncMarketDataService(MarketDataService(), transport=httpx.MockTransport(handler))
+
+def run(coro_fn):
+    """Run a coroutine function against a fresh event loop"""
+    return asyncio.run(coro_fn())
+
+def test_async_get_price_uses_yahoo_chart():
+    """Test the async service prices a symbol from the Yahoo chart endpoint"""
+    def handler(request):
+        assert request.url.path == "/v8/finance/chart/AAPL"
+        return httpx.Response(200, json={"chart": {"result": [{"meta": {"regularMarketPrice": 150.0}}]}})
+
+    service = make_service(handler)
+
+    async def scenario():
+        try:
+            return await service.get_price("AAPL")
+        finally:
+            await service.aclose()
+
+    assert run(scenario) == 150.0
+    assert service.market_data.cache.get("AAPL").source == "yahoo"
+
+def test_async_get_price_falls_through_failed_provider():
+    """Test a failing provider falls through to the next one"""
+    def handler(request):
+        if request.url.host == "query1.finance.yahoo.com":
+            return httpx.Response(500)
+        return httpx.Response(200, json=[{"symbol": "AAPL", "price": 151.0}])
+
+    service = make_service(handler)
+
+    async def scenario():
+        try:
+            return await service.get_price("AAPL")
+        finally:
+            await service.aclose()
+
+    assert run(scenario) == 151.0
+    assert service.market_data.provider_health()["yahoo"]["total_failures"] == 1
+
+def test_async_multiple_prices_batches_and_dedupes():
+    """Test the async fan-out prices duplicates once using a single batch request"""
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.url.path)
+        return httpx.Response(200, json={"quoteResponse": {"result": [
+            {"symbol": "AAPL", "regularMarketPrice": 150.0},
+            {"symbol": "MSFT", "regularMarketPrice": 300.0},
+        ]}})
+
+    service = make_service(handler)
+
+    async def scenario():
+        try:
+            return await service.get_multiple_prices(["AAPL", "MSFT", "AAPL", "CASH"])
+        finally:
+            await service.aclose()
+
+    assert run(scenario) == {"AAPL": 150.0, "MSFT": 300.0, "CASH": 1.0}
+    assert requests_seen == ["/v7/finance/quote"]
+
+def test_async_hedged_request_cancels_loser():
+    """Test the hedged async chain returns the fast provider and cancels the slow one"""
+    cancelled = []
+
+    async def slow(symbol):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(symbol)
+            raise
+
+    async def fast(symbol):
+        return 150.0
+
+    service = make_service(lambda request: httpx.Response(500))
+
+    async def scenario():
+        with patch('src.backend.utils.async_market_data.settings.hedged_requests', True), \
+             patch('src.backend.utils.async_market_data.settings.hedge_delay', 0.05), \
+             patch.object(service, '_providers', return_value={"yahoo": slow, "fmp": fast}):
+            result = await service._fetch_price("AAPL")
+            await asyncio.sleep(0)
+            return result
+
+    assert run(scenario) == (150.0, "fmp")
+    assert cancelled == ["AAPL"]
+
+def test_async_hedged_loser_releases_half_open_trial():
+    """Test a half-open trial call that loses a hedged race doesn't leave the provider blocked"""
+    async def slow_primary(symbol):
+        await asyncio.sleep(0.1)
+        return 149.0
+
+    async def trial(symbol):
+        await asyncio.sleep(5)
+        return 150.0
+
+    service = make_service(lambda request: httpx.Response(500))
+    health = service.market_data.health
+    health._get("fmp").open_until = time.time() - 1  # Cool-down over: half-open
+
+    async def scenario():
+        with patch('src.backend.utils.async_market_data.settings.hedged_requests', True), \
+             patch('src.backend.utils.async_market_data.settings.hedge_delay', 0.02), \
+             patch.object(service, '_providers', return_value={"yahoo": slow_primary, "fmp": trial}):
+            result = await service._fetch_price("AAPL")
+            await asyncio.sleep(0)
+            return result
+
+    assert run(scenario) == (149.0, "yahoo")
+    assert service.market_data.provider_health()["fmp"]["state"] == "half_open"
+    assert health.allow("fmp")
+
+def test_async_get_price_raises_when_all_providers_fail():
+    """Test MarketDataError is raised when nothing can price a symbol"""
+    service = make_service(lambda request: httpx.Response(500))
+
+    async def scenario():
+        with patch('src.backend.utils.async_market_data.YFINANCE_AVAILABLE', False):
+            try:
+                await service.get_price("AAPL")
+            finally:
+                await service.aclose()
+
+    with pytest.raises(MarketDataError):
+        run(scenario)
+
+def test_get_quotes_reports_source_and_staleness():
+    """Test quotes carry their provider, fetch time and staleness, with failures marked as fallback"""
+    def handler(request):
+        if request.url.path == "/v7/finance/quote":
+            return httpx.Response(200, json={"quoteResponse": {"result": [
+                {"symbol": "MSFT", "regularMarketPrice": 300.0}]}})
+        return httpx.Response(500)
+
+    service = make_service(handler)
+    cache = service.market_data.cache
+    cache.set("AAPL", 150.0, "fmp", fetched_at=cache.set("X", 0).fetched_at - cache.ttl - 1)
+
+    async def scenario():
+        try:
+            return await service.get_quotes(["AAPL", "MSFT", "CASH", "NOPE"])
+        finally:
+            await service.aclose()
+
+    quotes = run(scenario)
+    assert quotes["AAPL"]["source"] == "fmp" and quotes["AAPL"]["stale"] is True
+    assert quotes["MSFT"] == {"price": 300.0, "source": "yahoo-batch",
+                              "fetched_at": quotes["MSFT"]["fetched_at"], "stale": False}
+    assert quotes["MSFT"]["fetched_at"] is not None
+    assert quotes["CASH"]["source"] == "cash"
+    assert quotes["NOPE"]["source"] == "fallback"
+
+def test_unpriceable_symbols_are_not_refetched_on_every_request():
+    """Test a symbol no provider can price is served its fallback for a while instead of re-walking the chain"""
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.url.path)
+        if request.url.path == "/v7/finance/quote":
+            return httpx.Response(200, json={"quoteResponse": {"result": []}})
+        return httpx.Response(500)
+
+    service = make_service(handler)
+
+    async def scenario():
+        try:
+            return [await service.get_quotes(["NOPE"]) for _ in range(3)]
+        finally:
+            await service.aclose()
+
+    with patch('src.backend.utils.async_market_data.YFINANCE_AVAILABLE', False):
+        first, second, third = run(scenario)
+    assert first == second == third
+    assert first["NOPE"]["source"] == "fallback"
+    # Batch quote plus Yahoo, FMP and IEX once, not once per request
+    assert len(requests_seen) == 4
+
+def test_concurrent_callers_share_in_flight_fetch():
+    """Test overlapping refreshes (e.g. two portfolios holding AAPL) fetch a symbol once"""
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request.url.params["symbols"])
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"quoteResponse": {"result": [
+            {"symbol": symbol, "regularMarketPrice": 100.0} for symbol in request.url.params["symbols"].split(",")
+        ]}})
+
+    service = make_service(handler)
+
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                service.get_multiple_prices(["AAPL", "MSFT"]),
+                service.get_multiple_prices(["AAPL", "GOOGL"]),
+            )
+        finally:
+            await service.aclose()
+
+    first, second = run(scenario)
+    assert first == {"AAPL": 100.0, "MSFT": 100.0}
+    assert second == {"AAPL": 100.0, "GOOGL": 100.0}
+    assert requests_seen == ["AAPL,MSFT", "GOOGL"]
+
+def test_async_multiple_prices_revalidates_stale_symbols_in_one_batch():
+    """Test stale prices are served and refreshed in one background batch, not one task per symbol"""
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.url.path)
+        return httpx.Response(200, json={"quoteResponse": {"result": [
+            {"symbol": symbol, "regularMarketPrice": 11.0} for symbol in request.url.params["symbols"].split(",")
+        ]}})
+
+    service = make_service(handler)
+    cache = service.market_data.cache
+    symbols = [f"SYM{i}" for i in range(40)]
+    for symbol in symbols:
+        cache.set(symbol, 10.0, "yahoo", fetched_at=time.time() - cache.ttl - 1)
+
+    async def scenario():
+        try:
+            prices = await service.get_multiple_prices(symbols)
+            assert len(set(service._refresh_tasks.values())) == 1
+            await asyncio.gather(*set(service._refresh_tasks.values()))
+            return prices
+        finally:
+            await service.aclose()
+
+    assert run(scenario) == {symbol: 10.0 for symbol in symbols}
+    assert requests_seen == ["/v7/finance/quote"]
+    assert cache.get("SYM0").price == 11.0
+
+def test_cancelled_async_acquire_returns_its_token():
+    """Test a caller cancelled while waiting for a token gives it back to the callers behind it"""
+    bucket = TokenBucket(rate=1.0, capacity=1)
+
+    async def scenario():
+        await bucket.acquire_async()
+        waiter = asyncio.ensure_future(bucket.acquire_async())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # Only the first caller's token is spent, so the next one waits about a second, not two
+        return bucket.reserve()
+
+    assert run(scenario) == pytest.approx(1.0, abs=0.1)
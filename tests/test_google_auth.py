@@ -0,0 +1,40 @@
+from unittest.mock import patch
+from src.backend.utils.google_auth import GoogleSheetsClient
+
+# The autouse sheets mock in conftest replaces read_ranges, so keep the real one
+read_ranges = GoogleSheetsClient.read_ranges
+
+@patch('googleapiclient.discovery.build')
+@patch.object(GoogleSheetsClient, 'get_credentials')
+def test_read_ranges_uses_one_batch_get(mock_credentials, mock_build):
+    """Test read_ranges fetches every range in one batchGet and maps results back by request order"""
+    values_api = mock_build.return_value.spreadsheets.return_value.values.return_value
+    values_api.batchGet.return_value.execute.return_value = {
+        "valueRanges": [
+            {"range": "Fidelity!A2:D1000", "values": [["Roth IRA", "AAPL", "10", "150.00"]]},
+            {"range": "Webull!A2:C1000"},
+        ]
+    }
+
+    client = GoogleSheetsClient()
+    result = read_ranges(client, ["Fidelity!A2:D", "Webull!A2:C", "Kraken!A2:C"])
+
+    values_api.batchGet.assert_called_once()
+    assert values_api.batchGet.call_args.kwargs["ranges"] == ["Fidelity!A2:D", "Webull!A2:C", "Kraken!A2:C"]
+    assert result == {
+        "Fidelity!A2:D": [["Roth IRA", "AAPL", "10", "150.00"]],
+        "Webull!A2:C": [],
+        "Kraken!A2:C": [],
+    }
+
+@patch('googleapiclient.discovery.build')
+@patch.object(GoogleSheetsClient, 'get_credentials')
+def test_service_built_lazily(mock_credentials, mock_build):
+    """Test creating the client does no credential or discovery work until the API is used"""
+    client = GoogleSheetsClient()
+    mock_credentials.assert_not_called()
+    mock_build.assert_not_called()
+
+    assert client.service is client.service
+    mock_build.assert_called_once()
+    assert mock_build.call_args.kwargs["static_discovery"] is True
@@ -0,0 +1,119 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from src.backend import main
+from src.backend.api.refresh_jobs import RefreshJobs
+from src.backend.utils.async_market_data import AsyncMarketDataService
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "portfolios", None)
+    monkeypatch.setattr(main, "market_data", None)
+    monkeypatch.setattr(main, "refresh_jobs", RefreshJobs())
+    monkeypatch.setattr(main.settings, "background_refresh", False)
+    prices = {"AAPL": 160.00, "GOOGL": 2900.00, "MSFT": 300.00, "TSLA": 800.00, "BTC": 45000.00, "ETH": 3000.00}
+    with patch.object(AsyncMarketDataService, "get_multiple_prices", AsyncMock(side_effect=lambda symbols: {s: prices.get(s, 1.0) for s in dict.fromkeys(symbols)})):
+        yield TestClient(main.app)
+
+def test_import_does_not_build_tracker():
+    """Test importing the app does no sheet or market data work"""
+    with patch('src.backend.api.portfolio_registry.PortfolioTracker') as mock_tracker:
+        import importlib
+        importlib.reload(main)
+        mock_tracker.assert_not_called()
+        assert main.portfolios is None
+
+def test_tracker_built_on_first_request(client):
+    """Test the tracker is created lazily and reused across requests"""
+    response = client.get("/api/portfolio/summary")
+    assert response.status_code == 200
+    assert response.json()["total_value"] > 0
+
+    tracker = main.portfolios._refreshers[main.settings.sheet_id].tracker
+    client.post("/api/portfolio/refresh")
+    assert main.portfolios._refreshers[main.settings.sheet_id].tracker is tracker
+
+def test_startup_survives_sheet_outage(client):
+    """Test the app still boots when the sheets can't be read, and reports the error per request"""
+    with patch('src.backend.utils.google_auth.GoogleSheetsClient.read_ranges', side_effect=RuntimeError("Sheets down")):
+        with client:
+            response = client.get("/api/portfolio/summary")
+    assert response.status_code == 500
+    assert "Sheets down" in response.json()["detail"]
+
+def test_background_refresh_job(client):
+    """Test a background refresh returns a job id that can be polled to completion"""
+    with client:
+        response = client.post("/api/portfolio/refresh", params={"background": "true"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        status = client.get(f"/api/portfolio/refresh/{job_id}").json()
+        for _ in range(50):
+            if status["status"] != "running":
+                break
+            time.sleep(0.01)
+            status = client.get(f"/api/portfolio/refresh/{job_id}").json()
+
+    assert status["status"] == "succeeded"
+    assert status["snapshot_version"] is not None
+    assert client.get("/api/portfolio/refresh/unknown").status_code == 404
+
+def test_summary_etag_and_not_modified(client):
+    """Test the summary carries a strong ETag and unchanged polls get an empty 304"""
+    first = client.get("/api/portfolio/summary")
+    etag = first.headers["etag"]
+    assert etag.startswith('"')
+
+    second = client.get("/api/portfolio/summary", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    assert client.get("/api/portfolio/summary", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+def test_summary_gzipped_when_large(client, monkeypatch):
+    """Test bodies over the size threshold are served precompressed"""
+    monkeypatch.setattr(main.settings, "gzip_min_size", 0)
+    response = client.get("/api/portfolio/summary", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["total_value"] > 0
+
+def test_gzip_variant_has_its_own_etag(client, monkeypatch):
+    """Test the gzip and identity bodies get distinct strong ETags and gzip;q=0 is honoured"""
+    monkeypatch.setattr(main.settings, "gzip_min_size", 0)
+    gzipped = client.get("/api/portfolio/summary", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/api/portfolio/summary", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in identity.headers
+    assert gzipped.headers["etag"] == identity.headers["etag"][:-1] + '-gz"'
+
+    # Either validator revalidates the current version
+    for etag in (gzipped.headers["etag"], identity.headers["etag"]):
+        assert client.get("/api/portfolio/summary", headers={"If-None-Match": etag}).status_code == 304
+
+def test_prices_endpoint_validates_symbols(client, monkeypatch):
+    """Test the batch price endpoint dedupes symbols and rejects empty or oversized requests"""
+    response = client.get("/api/prices", params={"symbols": "AAPL, MSFT,AAPL"})
+    assert response.status_code == 200
+    assert list(response.json()["quotes"]) == ["AAPL", "MSFT"]
+
+    assert client.get("/api/prices", params={"symbols": " , "}).status_code == 400
+    monkeypatch.setattr(main.settings, "max_price_symbols", 1)
+    assert client.get("/api/prices", params={"symbols": "AAPL,MSFT"}).status_code == 400
+
+def test_multiple_portfolios_share_market_data(client, monkeypatch):
+    """Test each allowed sheet id gets its own tracker on the one shared market data service"""
+    monkeypatch.setattr(main.settings, "allowed_sheet_ids", ["household-2"])
+    assert client.get("/api/portfolio/summary").status_code == 200
+    assert client.get("/api/portfolio/summary", params={"sheet_id": "household-2"}).status_code == 200
+
+    trackers = [refresher.tracker for refresher in main.portfolios._refreshers.values()]
+    assert [tracker.sheet_id for tracker in trackers] == [main.settings.sheet_id, "household-2"]
+    assert all(tracker.async_market_data is main.market_data for tracker in trackers)
+
+def test_unknown_portfolio_forbidden(client):
+    """Test a sheet id that isn't configured is refused without touching the sheets"""
+    response = client.get("/api/portfolio/summary", params={"sheet_id": "someone-else"})
+    assert response.status_code == 403
+    assert len(main.get_portfolios()) == 0
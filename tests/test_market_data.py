@@ -1,12 +1,29 @@
 import pytest
 from unittest.mock import Mock, patch
 from datetime import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+import requests
 from src.backend.utils.market_data import MarketDataService, MarketDataError
+from src.backend.utils.quote_cache import QuoteCache
+from src.backend.utils.quote_store import QuoteStore
+from src.backend.utils.rate_limiter import RateLimiter, TokenBucket
+from src.backend.utils.provider_health import ProviderHealthRegistry
+from src.backend.utils.log_config import StructuredFormatter
 
 @pytest.fixture
 def market_service():
     return MarketDataService()
 
+@pytest.fixture
+def no_batch_quotes(market_service):
+    """Make the batch quote path miss so every symbol goes through get_price"""
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value={}):
+        yield
+
 @pytest.fixture
 def mock_yf_ticker():
     """Mock yfinance ticker with sample data"""
@@ -118,4 +135,369 @@ def test_rate_limiting(mock_ticker_class, market_service, mock_yf_ticker):
         pytest.fail(f"Rate limiting failed: {e}")
         
     # Only one API call should be made due to caching
-    assert mock_ticker_class.call_count == 1
\ No newline at end of file
+    assert mock_ticker_class.call_count == 1
+
+def test_multiple_prices_dedupes_symbols(market_service, no_batch_quotes):
+    """Test duplicate symbols are only fetched once"""
+    with patch.object(market_service, 'get_price', side_effect=lambda s: {"AAPL": 150.0, "MSFT": 300.0}[s]) as mock_get_price:
+        prices = market_service.get_multiple_prices(["AAPL", "MSFT", "AAPL", "AAPL"])
+
+    assert prices == {"AAPL": 150.0, "MSFT": 300.0}
+    assert mock_get_price.call_count == 2
+
+def test_multiple_prices_fetches_concurrently(market_service, no_batch_quotes):
+    """Test symbols are fetched in parallel rather than one after another"""
+    def slow_price(symbol):
+        time.sleep(0.2)
+        return 100.0
+
+    symbols = ["AAPL", "MSFT", "GOOGL", "TSLA"]
+    with patch.object(market_service, 'get_price', side_effect=slow_price):
+        start = time.time()
+        prices = market_service.get_multiple_prices(symbols, max_workers=4)
+        elapsed = time.time() - start
+
+    assert set(prices) == set(symbols)
+    assert elapsed < 0.6
+
+def test_multiple_prices_falls_back_per_symbol(market_service, no_batch_quotes):
+    """Test a failing symbol falls back without affecting the others"""
+    def flaky_price(symbol):
+        if symbol == "NVDA":
+            raise MarketDataError("All methods failed for NVDA")
+        return 150.0
+
+    with patch.object(market_service, 'get_price', side_effect=flaky_price):
+        prices = market_service.get_multiple_prices(["AAPL", "NVDA"])
+
+    assert prices["AAPL"] == 150.0
+    assert prices["NVDA"] == MarketDataService.MOCK_PRICES["NVDA"]
+
+
+def test_quotes_batch_single_request(market_service):
+    """Test batch quotes price several symbols with one HTTP request"""
+    response = Mock()
+    response.json.return_value = {
+        "quoteResponse": {"result": [
+            {"symbol": "AAPL", "regularMarketPrice": 150.0},
+            {"symbol": "BTC-USD", "regularMarketPrice": 45000.0},
+        ]}
+    }
+
+    with patch.object(market_service.session, 'get', return_value=response) as mock_get:
+        prices = market_service.get_quotes_batch(["AAPL", "BTC", "CASH"])
+
+    assert prices == {"AAPL": 150.0, "BTC": 45000.0, "CASH": 1.0}
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["params"] == {"symbols": "AAPL,BTC-USD"}
+
+def test_multiple_prices_only_fetches_batch_misses(market_service):
+    """Test symbols missing from the batch fall through to get_price"""
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value={"AAPL": 150.0}), \
+         patch.object(market_service, 'get_price', return_value=300.0) as mock_get_price:
+        prices = market_service.get_multiple_prices(["AAPL", "MSFT"])
+
+    assert prices == {"AAPL": 150.0, "MSFT": 300.0}
+    mock_get_price.assert_called_once_with("MSFT")
+
+def test_cached_price_expires_after_ttl(market_service):
+    """Test prices are refetched once their TTL has passed"""
+    market_service._cache.ttl = 60
+    market_service._cache.stale_while_revalidate = 0
+
+    with patch.object(market_service, '_fetch_price', return_value=(150.0, "yahoo")) as mock_fetch:
+        assert market_service.get_price("AAPL") == 150.0
+        assert market_service.get_price("AAPL") == 150.0
+        assert mock_fetch.call_count == 1
+
+        with patch('src.backend.utils.quote_cache.time.time', return_value=time.time() + 120):
+            market_service.get_price("AAPL")
+        assert mock_fetch.call_count == 2
+
+def test_stale_while_revalidate_serves_last_price(market_service):
+    """Test a stale price is returned immediately while one background refresh runs"""
+    market_service._cache.set("AAPL", 150.0, "yahoo", fetched_at=time.time() - market_service._cache.ttl - 1)
+
+    with patch.object(market_service, '_fetch_price', return_value=(155.0, "yahoo")) as mock_fetch:
+        assert market_service.get_price("AAPL") == 150.0
+        for thread in [t for t in threading.enumerate() if t.name.startswith("revalidate-")]:
+            thread.join(timeout=1)
+
+    assert mock_fetch.call_count == 1
+    assert market_service._cache.get("AAPL").price == 155.0
+
+def test_multiple_prices_revalidates_stale_symbols_in_one_batch(market_service):
+    """Test stale prices are served and refreshed with one batch request, not one fetch per symbol"""
+    symbols = [f"SYM{i}" for i in range(40)]
+    for symbol in symbols:
+        market_service._cache.set(symbol, 10.0, "yahoo", fetched_at=time.time() - market_service._cache.ttl - 1)
+
+    batch = {symbol: 11.0 for symbol in symbols[:-1]}
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value=batch) as mock_batch, \
+         patch.object(market_service, '_fetch_price', return_value=(12.0, "fmp")) as mock_fetch:
+        prices = market_service.get_multiple_prices(symbols)
+        for thread in [t for t in threading.enumerate() if t.name.startswith("revalidate-")]:
+            thread.join(timeout=1)
+
+    assert prices == {symbol: 10.0 for symbol in symbols}
+    mock_batch.assert_called_once()
+    mock_fetch.assert_called_once_with("SYM39")
+    assert market_service._cache.get("SYM0").price == 11.0
+    assert market_service._cache.get("SYM39").price == 12.0
+    assert not market_service._refreshing
+
+def test_stale_if_error_serves_expired_price(market_service):
+    """Test an expired price is served when every provider fails"""
+    cache = market_service._cache
+    cache.set("AAPL", 150.0, "yahoo", fetched_at=time.time() - cache.ttl - cache.stale_while_revalidate - 1)
+
+    with patch.object(market_service, '_fetch_price', side_effect=MarketDataError("All methods failed for AAPL")):
+        assert market_service.get_price("AAPL") == 150.0
+        with pytest.raises(MarketDataError):
+            market_service.get_price("MSFT")
+
+def test_quote_cache_evicts_least_recently_used():
+    """Test the quote cache stays within its size limit"""
+    cache = QuoteCache(ttl=60, max_size=2)
+    cache.set("AAPL", 150.0)
+    cache.set("MSFT", 300.0)
+    cache.get("AAPL")
+    cache.set("GOOGL", 140.0)
+
+    assert "AAPL" in cache
+    assert "MSFT" not in cache
+    assert len(cache) == 2
+
+def test_token_bucket_allows_burst_then_waits():
+    """Test the token bucket allows its burst and then paces callers"""
+    bucket = TokenBucket(rate=10.0, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert not bucket.try_acquire()
+
+def test_rate_limiter_is_per_provider():
+    """Test exhausting one provider's bucket does not slow another"""
+    limiter = RateLimiter({"yahoo": (1.0, 1), "fmp": (1.0, 1)})
+    assert limiter.try_acquire("yahoo")
+    assert not limiter.try_acquire("yahoo")
+    assert limiter.try_acquire("fmp")
+
+def test_token_bucket_is_thread_safe():
+    """Test concurrent callers never take more tokens than the bucket holds"""
+    bucket = TokenBucket(rate=0.001, capacity=5)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(bucket.try_acquire())) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+
+def test_cash_skips_rate_limiting(market_service):
+    """Test cash positions never touch a provider bucket"""
+    with patch.object(market_service.rate_limiter, 'acquire') as mock_acquire:
+        assert market_service.get_price("CASH") == 1.0
+    mock_acquire.assert_not_called()
+
+def test_circuit_opens_after_repeated_failures():
+    """Test a provider is skipped after consecutive failures until the cool-down passes"""
+    registry = ProviderHealthRegistry(failure_threshold=2, cooldown=60)
+    registry.record_failure("iex", 0.1, "401 Unauthorized")
+    assert registry.allow("iex")
+    registry.record_failure("iex", 0.1, "401 Unauthorized")
+    assert not registry.allow("iex")
+    assert registry.snapshot()["iex"]["state"] == "open"
+
+    with patch('src.backend.utils.provider_health.time.time', return_value=time.time() + 61):
+        assert registry.allow("iex")      # half-open trial
+        assert not registry.allow("iex")  # only one trial at a time
+        registry.record_success("iex", 0.1)
+        assert registry.snapshot()["iex"]["state"] == "closed"
+
+def test_provider_order_prefers_fastest_healthy():
+    """Test measured healthy providers are ordered by latency and open circuits go last"""
+    registry = ProviderHealthRegistry(failure_threshold=1, cooldown=60)
+    registry.record_success("yahoo", 0.8)
+    registry.record_success("fmp", 0.2)
+    registry.record_failure("iex", 0.1)
+
+    assert registry.order(["yahoo", "fmp", "iex", "yfinance"]) == ["fmp", "yahoo", "yfinance", "iex"]
+
+def test_provider_order_ranks_empty_answers_behind_prices(market_service):
+    """Test a fast provider that answers without prices doesn't rank ahead of one that prices"""
+    empty = Mock(return_value=None)
+    priced = Mock(return_value=150.0)
+    with patch('src.backend.utils.market_data.time.monotonic', side_effect=[0.0, 0.05, 0.0, 0.5]):
+        market_service._call_provider("fmp", empty, "AAPL")
+        market_service._call_provider("yahoo", priced, "AAPL")
+
+    health = market_service.provider_health()
+    assert health["fmp"]["state"] == "closed"
+    assert health["fmp"]["success_rate"] == 1.0
+    assert health["fmp"]["hit_rate"] == 0.0
+    assert market_service.health.order(["fmp", "yahoo"]) == ["yahoo", "fmp"]
+
+def test_quotes_batch_outcomes_classified_like_single_calls(market_service):
+    """Test an empty batch is a miss, not a hit, and a batch 404 doesn't count as a failure"""
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value={}):
+        market_service.get_quotes_batch(["ZZZZ"])
+    not_found = requests.HTTPError("404", response=Mock(status_code=404))
+    with patch.object(market_service, '_try_yahoo_quote_batch', side_effect=not_found):
+        market_service.get_quotes_batch(["ZZZZ"])
+
+    health = market_service.provider_health()["yahoo"]
+    assert health["hit_rate"] == 0.0
+    assert health["total_failures"] == 0
+
+def test_fetch_price_skips_open_circuit(market_service):
+    """Test a dead provider is not called again once its circuit opens"""
+    market_service.health.failure_threshold = 1
+    dead = Mock(side_effect=requests.ConnectionError("timeout"))
+    healthy = Mock(return_value=150.0)
+
+    with patch.object(market_service, '_providers', return_value={"yahoo": dead, "fmp": healthy}):
+        assert market_service._fetch_price("AAPL") == (150.0, "fmp")
+        assert market_service._fetch_price("MSFT") == (150.0, "fmp")
+
+    assert dead.call_count == 1
+    assert market_service.provider_health()["yahoo"]["state"] == "open"
+
+def test_hedged_request_beats_slow_provider(market_service):
+    """Test a hedged request returns the fast provider's price without waiting for the slow one"""
+    def slow(symbol):
+        time.sleep(1)
+        return 149.0
+
+    fast = Mock(return_value=150.0)
+
+    with patch('src.backend.utils.market_data.settings.hedged_requests', True), \
+         patch('src.backend.utils.market_data.settings.hedge_delay', 0.05), \
+         patch.object(market_service, '_providers', return_value={"yahoo": slow, "fmp": fast}):
+        start = time.time()
+        result = market_service._fetch_price("AAPL")
+        elapsed = time.time() - start
+
+    assert result == (150.0, "fmp")
+    assert elapsed < 0.5
+
+def test_hedged_request_does_not_hedge_fast_provider(market_service):
+    """Test a healthy primary answers alone without extra provider load"""
+    primary = Mock(return_value=150.0)
+    backup = Mock(return_value=149.0)
+
+    with patch('src.backend.utils.market_data.settings.hedged_requests', True), \
+         patch('src.backend.utils.market_data.settings.hedge_delay', 0.5), \
+         patch.object(market_service, '_providers', return_value={"yahoo": primary, "fmp": backup}):
+        assert market_service._fetch_price("AAPL") == (150.0, "yahoo")
+
+    backup.assert_not_called()
+
+def test_hedged_request_falls_through_empty_providers(market_service):
+    """Test the hedged chain moves on when a provider has no price"""
+    with patch('src.backend.utils.market_data.settings.hedged_requests', True), \
+         patch.object(market_service, '_providers', return_value={"yahoo": Mock(return_value=None), "fmp": Mock(return_value=None)}):
+        with pytest.raises(MarketDataError):
+            market_service._fetch_price("AAPL")
+
+def test_hedged_request_releases_cancelled_trial(market_service):
+    """Test a half-open trial still queued when another provider wins is given back, not lost"""
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+    class BusyExecutor(ThreadPoolExecutor):
+        """Runs the primary; every hedge stays queued behind it"""
+        def submit(self, fn, provider, *args):
+            if provider == "yahoo":
+                return super().submit(fn, provider, *args)
+            return Future()
+
+    def slow(symbol):
+        time.sleep(0.1)
+        return 149.0
+
+    trial = Mock(return_value=150.0)
+    market_service.health._get("fmp").open_until = time.time() - 1  # Cool-down over: half-open
+    market_service._hedge_executor = BusyExecutor(max_workers=1)
+
+    with patch('src.backend.utils.market_data.settings.hedged_requests', True), \
+         patch('src.backend.utils.market_data.settings.hedge_delay', 0.02), \
+         patch.object(market_service, '_providers', return_value={"yahoo": slow, "fmp": trial}):
+        assert market_service._fetch_price("AAPL") == (149.0, "yahoo")
+
+    trial.assert_not_called()
+    assert market_service.provider_health()["fmp"]["state"] == "half_open"
+    assert market_service.health.allow("fmp")
+
+def test_quote_store_warm_starts_cache(tmp_path):
+    """Test a new cache warm-starts from quotes persisted by a previous process"""
+    path = str(tmp_path / "quotes.db")
+    QuoteCache(ttl=60, store=QuoteStore(path)).set("AAPL", 150.0, "yahoo")
+
+    restarted = QuoteCache(ttl=60, store=QuoteStore(path))
+    quote = restarted.get("AAPL")
+    assert quote.price == 150.0
+    assert quote.source == "yahoo"
+    assert restarted.is_fresh(quote)
+
+def test_quote_store_skips_unusable_quotes(tmp_path):
+    """Test quotes too old to ever be served are not loaded"""
+    store = QuoteStore(str(tmp_path / "quotes.db"))
+    QuoteCache(ttl=60, store=store).set("AAPL", 150.0, fetched_at=time.time() - 3600)
+    QuoteCache(ttl=60, store=store).set("MSFT", 300.0, fetched_at=time.time() - 90)
+
+    restarted = QuoteCache(ttl=60, stale_while_revalidate=60, store=store)
+    assert "AAPL" not in restarted
+    assert "MSFT" in restarted
+    assert not restarted.is_fresh(restarted.get("MSFT"))
+
+def test_quote_store_errors_do_not_fail_refresh(market_service):
+    """Test a locked quote store is logged and the refresh is still served from memory"""
+    store = Mock()
+    store.save.side_effect = sqlite3.OperationalError("database is locked")
+    store.clear.side_effect = sqlite3.OperationalError("database is locked")
+    market_service._cache.store = store
+
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value={"AAPL": 150.0, "MSFT": 300.0}):
+        assert market_service.get_multiple_prices(["AAPL", "MSFT"]) == {"AAPL": 150.0, "MSFT": 300.0}
+    assert store.save.call_count == 2
+    assert market_service._cache.get("AAPL").price == 150.0
+
+    market_service.clear_cache()
+    assert len(market_service._cache) == 0
+
+def test_warm_started_service_skips_fresh_symbols(tmp_path):
+    """Test a restarted service answers fresh symbols without calling a provider"""
+    path = str(tmp_path / "quotes.db")
+    with patch('src.backend.utils.market_data.settings.quote_store_path', path):
+        MarketDataService()._cache.set("AAPL", 150.0, "yahoo")
+        restarted = MarketDataService()
+
+    with patch.object(restarted, '_fetch_price') as mock_fetch:
+        assert restarted.get_price("AAPL") == 150.0
+    mock_fetch.assert_not_called()
+
+def test_multiple_prices_logs_one_summary_event(market_service, caplog):
+    """Test a refresh emits a single INFO summary event and no per-symbol INFO lines"""
+    market_service._cache.set("AAPL", 150.0, "yahoo")
+
+    with patch.object(market_service, '_try_yahoo_quote_batch', return_value={"MSFT": 300.0}), \
+         caplog.at_level(logging.INFO, logger="src.backend"):
+        market_service.get_multiple_prices(["AAPL", "MSFT", "MSFT"])
+
+    events = [r for r in caplog.records if getattr(r, "event", None) == "price_refresh"]
+    assert len(events) == 1
+    assert events[0].cache_hits == 1
+    assert events[0].sources == {"cache": 1, "yahoo-batch": 1}
+    assert all(r.levelno >= logging.INFO for r in caplog.records)
+    assert len(caplog.records) == 1
+
+def test_structured_formatter_includes_extra_fields():
+    """Test the JSON formatter emits extra fields alongside the message"""
+    record = logging.LogRecord("src.backend.test", logging.INFO, __file__, 1, "Priced %d symbols", (2,), None)
+    record.event = "price_refresh"
+
+    entry = json.loads(StructuredFormatter().format(record))
+    assert entry["message"] == "Priced 2 symbols"
+    assert entry["event"] == "price_refresh"
+    assert entry["level"] == "INFO"
@@ -0,0 +1,61 @@
+import time
+import pytest
+import numpy as np
+from src.backend.api.portfolio_tracker import Position, BrokerSheet
+from src.backend.api.performance import money_weighted_return, portfolio_performance
+
+DAY = 86400
+BROKERS = [broker.value for broker in BrokerSheet]
+
+def timeline(days):
+    return (np.arange(days) * DAY).astype("M8[s]")
+
+def test_value_series_by_broker_and_symbol():
+    """Test value series are quantity-weighted closes, split by broker and symbol"""
+    positions = [
+        Position(broker=BrokerSheet.WEBULL, symbol="AAPL", quantity=2, cost_basis=1.0),
+        Position(broker=BrokerSheet.FIDELITY, account_type="Roth IRA", symbol="AAPL", quantity=1, cost_basis=1.0),
+        Position(broker=BrokerSheet.KRAKEN, symbol="BTC", quantity=0.5, cost_basis=1.0),
+    ]
+    closes = np.array([[10.0, 100.0], [11.0, 110.0], [12.0, 90.0]])
+
+    result = portfolio_performance(positions, ["AAPL", "BTC"], BROKERS, timeline(3), closes)
+
+    assert result["total"] == [80.0, 88.0, 81.0]
+    assert result["by_symbol"]["AAPL"] == [30.0, 33.0, 36.0]
+    assert result["by_broker"]["Webull"] == [20.0, 22.0, 24.0]
+    assert result["by_broker"]["Kraken"] == [50.0, 55.0, 45.0]
+    assert result["twr"] == pytest.approx(81.0 / 80.0 - 1.0)
+
+def test_late_history_is_not_counted_as_return():
+    """Test a symbol whose history starts mid-window adds value but no return"""
+    positions = [
+        Position(broker=BrokerSheet.WEBULL, symbol="AAPL", quantity=1, cost_basis=1.0),
+        Position(broker=BrokerSheet.WEBULL, symbol="NEW", quantity=1, cost_basis=1.0),
+    ]
+    closes = np.array([[100.0, np.nan], [100.0, 50.0], [110.0, 50.0]])
+
+    result = portfolio_performance(positions, ["AAPL", "NEW"], BROKERS, timeline(3), closes)
+
+    assert result["total"] == [100.0, 150.0, 160.0]
+    assert result["twr"] == pytest.approx(10.0 / 150.0)
+
+def test_money_weighted_return_matches_known_irr():
+    """Test the IRR solver on a one-year doubling and a mid-year deposit"""
+    assert money_weighted_return(np.array([0.0, 1.0]), np.array([-100.0, 200.0])) == pytest.approx(1.0)
+
+    # 100 in at t=0, 100 more at t=0.5, 210 out at t=1: slightly under 7% a year
+    rate = money_weighted_return(np.array([0.0, 0.5, 1.0]), np.array([-100.0, -100.0, 210.0]))
+    npv = -100 - 100 * (1 + rate) ** -0.5 + 210 * (1 + rate) ** -1
+    assert npv == pytest.approx(0.0, abs=1e-8)
+
+def test_multi_year_history_is_fast():
+    """Test five years of daily closes over hundreds of holdings computes in milliseconds"""
+    symbols = [f"S{i}" for i in range(500)]
+    positions = [Position(broker=BrokerSheet.WEBULL, symbol=s, quantity=1, cost_basis=1.0) for s in symbols]
+    closes = 100 * np.cumprod(1 + np.random.default_rng(0).normal(0, 0.01, (1260, 500)), axis=0)
+
+    started = time.perf_counter()
+    result = portfolio_performance(positions, symbols, BROKERS, timeline(1260), closes)
+    assert time.perf_counter() - started < 1.0
+    assert result["mwr"] is not None
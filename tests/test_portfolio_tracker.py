@@ -1,5 +1,7 @@
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+import asyncio
+import json
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 from datetime import datetime
 from src.backend.api.portfolio_tracker import PortfolioTracker, Position, BrokerSheet
 
@@ -69,6 +71,7 @@ def tracker(mock_market_service, mock_sheets_client, mock_sheets_data, mock_pric
     
     mock_sheets_instance = Mock()
     mock_sheets_instance.read_range.side_effect = mock_read_range
+    mock_sheets_instance.read_ranges.side_effect = lambda ranges: {r: mock_read_range(r) for r in ranges}
     mock_sheets_client.return_value = mock_sheets_instance
     
     # Configure mock market data service
@@ -116,6 +119,22 @@ def test_position_validation():
             cost_basis=150.00
         )
 
+def test_position_from_rows():
+    """Test bulk construction matches the constructor and shares one timestamp"""
+    rows = [["Roth IRA", "AAPL", "10", "150.00"], ["Roth IRA", "MSFT"], ["Individual", "GOOGL", "5", "2500"]]
+    positions = Position.from_rows(BrokerSheet.FIDELITY, rows)
+
+    assert len(positions) == 2
+    assert positions[0] == Position(broker=BrokerSheet.FIDELITY, account_type="Roth IRA", symbol="AAPL",
+                                    quantity=10, cost_basis=150.00, last_updated=positions[0].last_updated)
+    assert positions[0].last_updated is positions[1].last_updated
+    assert not hasattr(positions[0], "__dict__")
+
+    with pytest.raises(ValueError):
+        Position.from_rows(BrokerSheet.WEBULL, [["AAPL", "-1", "150.00"]])
+    with pytest.raises(ValueError):
+        Position.from_rows(BrokerSheet.FIDELITY, [["", "AAPL", "10", "150.00"]])
+
 def test_position_calculations(sample_position_data):
     """Test position calculations"""
     position = Position(**sample_position_data)
@@ -232,6 +251,7 @@ def test_empty_sheet_handling(mock_sheets_data):
         # Configure mock to return empty data
         mock_sheets_instance = Mock()
         mock_sheets_instance.read_range.return_value = []
+        mock_sheets_instance.read_ranges.side_effect = lambda ranges: {r: [] for r in ranges}
         mock_sheets_client.return_value = mock_sheets_instance
         
         mock_market_instance = Mock()
@@ -257,6 +277,7 @@ def test_invalid_sheet_data_handling():
         
         mock_sheets_instance = Mock()
         mock_sheets_instance.read_range.side_effect = mock_read_range
+        mock_sheets_instance.read_ranges.side_effect = lambda ranges: {r: mock_read_range(r) for r in ranges}
         mock_sheets_client.return_value = mock_sheets_instance
         
         mock_market_instance = Mock()
@@ -265,4 +286,196 @@ def test_invalid_sheet_data_handling():
         tracker = PortfolioTracker()
         # Should only have 1 valid position (AAPL), invalid rows should be skipped
         assert len(tracker.positions) == 1
-        assert tracker.positions[0].symbol == "AAPL"
\ No newline at end of file
+        assert tracker.positions[0].symbol == "AAPL"
+
+def test_load_positions_single_round_trip(tracker):
+    """Test every broker tab is loaded through one batch read"""
+    tracker.sheets_client.read_ranges.reset_mock()
+    tracker.sheets_client.read_range.reset_mock()
+
+    tracker.load_positions()
+
+    tracker.sheets_client.read_ranges.assert_called_once()
+    tracker.sheets_client.read_range.assert_not_called()
+    assert len(tracker.positions) == 6
+
+def test_update_prices_async(tracker, mock_price_data):
+    """Test prices can be refreshed through the async market data service"""
+    tracker.async_market_data.get_multiple_prices = AsyncMock(return_value=mock_price_data)
+
+    asyncio.run(tracker.update_prices_async())
+
+    aapl_position = next(p for p in tracker.positions if p.symbol == "AAPL")
+    assert aapl_position.current_value == 160.00
+
+def test_columnar_summary_matches_loop_summary(tracker):
+    """Test the vectorized position book produces the same summary as the per-position loops"""
+    tracker.update_prices()
+    tracker.positions.append(Position(broker=BrokerSheet.WEBULL, symbol="AAPL", quantity=2, cost_basis=100.00))
+    tracker.positions.append(Position(broker=BrokerSheet.WEBULL, symbol="NEW", quantity=1, cost_basis=5.00))
+
+    with patch('src.backend.api.portfolio_tracker.settings.columnar_positions', False):
+        expected = tracker._full_summary()
+    with patch('src.backend.api.portfolio_tracker.settings.columnar_min_positions', 0):
+        actual = tracker._full_summary()
+
+    for key in ("total_value", "total_cost", "total_gain_loss"):
+        assert actual[key] == pytest.approx(expected[key])
+    for broker, broker_data in expected["by_broker"].items():
+        assert actual["by_broker"][broker] == pytest.approx(broker_data)
+    assert [p["symbol"] for p in actual["positions"]] == [p["symbol"] for p in expected["positions"]]
+    for got, want in zip(actual["positions"], expected["positions"]):
+        assert got["current_price"] == want["current_price"]
+        for key in ("market_value", "total_cost", "quantity", "gain_loss"):
+            assert got[key] == pytest.approx(want[key])
+
+def test_position_book_tracks_price_updates(tracker):
+    """Test prices applied after the book is built show up in the columnar summary"""
+    with patch('src.backend.api.portfolio_tracker.settings.columnar_min_positions', 0):
+        tracker.get_summary()
+        tracker.apply_prices({"AAPL": 200.00})
+        summary = tracker.get_summary()
+
+    aapl = next(p for p in summary["positions"] if p["symbol"] == "AAPL")
+    assert aapl["market_value"] == 2000.00
+    assert aapl["current_price"] == 200.00
+    assert summary["total_value"] == 2000.00
+
+def test_summary_cached_until_prices_change(tracker, mock_price_data):
+    """Test the summary is only rebuilt when a price actually changes"""
+    tracker.update_prices()
+    first = tracker.get_summary()
+    version = tracker.summary_version
+
+    assert tracker.apply_prices(mock_price_data) == set()
+    assert tracker.get_summary() is first
+    assert tracker.summary_version == version
+
+    assert tracker.apply_prices({"AAPL": 170.00}) == {"AAPL"}
+    assert tracker.summary_version == version + 1
+    assert tracker.get_summary() is not first
+
+def test_incremental_summary_matches_full_rebuild(tracker):
+    """Test incremental price updates leave the summary identical to a full recomputation"""
+    tracker.update_prices()
+    tracker.get_summary()
+
+    tracker.apply_prices({"AAPL": 5000.00, "ETH": 1.00, "TSLA": 800.00})
+    tracker.apply_prices({"GOOGL": 0.0})
+    incremental = tracker.get_summary()
+    full = tracker._full_summary()
+
+    for key in ("total_value", "total_cost", "total_gain_loss"):
+        assert incremental[key] == pytest.approx(full[key])
+    for broker, broker_data in full["by_broker"].items():
+        assert incremental["by_broker"][broker] == pytest.approx(broker_data)
+    assert [p["symbol"] for p in incremental["positions"]] == [p["symbol"] for p in full["positions"]]
+    assert incremental["positions"][0]["symbol"] == "AAPL"
+    for got, want in zip(incremental["positions"], full["positions"]):
+        assert got["current_price"] == want["current_price"]
+        assert got["market_value"] == pytest.approx(want["market_value"])
+        assert got["gain_loss"] == pytest.approx(want["gain_loss"])
+
+def test_summary_rebuilt_after_reload(tracker, mock_sheets_data):
+    """Test reloading changed positions invalidates the cached summary"""
+    tracker.update_prices()
+    first = tracker.get_summary()
+    version = tracker.summary_version
+
+    assert tracker.load_positions() is False
+    assert tracker.get_summary() is first
+
+    mock_sheets_data["webull"] = [["MSFT", "20", "280.00"], ["TSLA", "3", "900.00"]]
+    assert tracker.load_positions() is True
+
+    assert tracker.get_summary() is not first
+    assert tracker.summary_version > version
+
+def test_reload_applies_only_changed_rows(tracker, mock_sheets_data):
+    """Test a reload keeps untouched positions and only parses added or edited rows"""
+    tracker.update_prices()
+    before = {(p.broker, p.symbol): p for p in tracker.positions}
+
+    mock_sheets_data["webull"] = [
+        ["MSFT", "20", "280.00"],  # Edited
+        ["NVDA", "1", "400.00"],   # Added; TSLA removed
+    ]
+    tracker.load_positions()
+    after = {(p.broker, p.symbol): p for p in tracker.positions}
+
+    assert len(tracker.positions) == 6
+    assert (BrokerSheet.WEBULL, "TSLA") not in after
+    # Other brokers' ranges were unchanged, so their positions are the same objects
+    assert after[(BrokerSheet.FIDELITY, "AAPL")] is before[(BrokerSheet.FIDELITY, "AAPL")]
+    assert after[(BrokerSheet.KRAKEN, "BTC")] is before[(BrokerSheet.KRAKEN, "BTC")]
+
+    msft = after[(BrokerSheet.WEBULL, "MSFT")]
+    assert msft is not before[(BrokerSheet.WEBULL, "MSFT")]
+    assert msft.quantity == 20
+    assert msft.current_value == 300.00  # Last known price carried over
+    assert after[(BrokerSheet.WEBULL, "NVDA")].current_value is None
+
+def test_reload_renumbers_kept_rows(tracker, mock_sheets_data):
+    """Test positions kept across a reload follow their rows when a row is inserted above them"""
+    tsla = next(p for p in tracker.positions if p.symbol == "TSLA")
+    assert tsla.row == 3
+
+    mock_sheets_data["webull"] = [["NVDA", "1", "400.00"]] + mock_sheets_data["webull"]
+    tracker.load_positions()
+
+    assert next(p for p in tracker.positions if p.symbol == "TSLA") is tsla
+    assert tsla.row == 4
+    assert next(p for p in tracker.positions if p.symbol == "NVDA").row == 2
+
+def test_summary_payload_reused_until_prices_change(tracker):
+    """Test the serialized summary is built once per version"""
+    tracker.update_prices()
+    payload = tracker.get_summary_payload()
+
+    assert json.loads(payload.body) == tracker.get_summary()
+    assert tracker.get_summary_payload() is payload
+
+    tracker.apply_prices({"AAPL": 170.00})
+    updated = tracker.get_summary_payload()
+    assert updated is not payload
+    assert updated.etag != payload.etag
+
+def test_summary_delta_covers_changed_symbols(tracker):
+    """Test a delta carries the changed symbols, only their brokers, and the new totals"""
+    tracker.update_prices()
+    changed = tracker.apply_prices({"AAPL": 170.00})
+
+    delta = tracker.summary_delta(changed)
+    summary = tracker.get_summary()
+
+    assert list(delta["positions"]) == ["AAPL"]
+    assert delta["positions"]["AAPL"]["current_price"] == 170.00
+    assert delta["by_broker"] == {"Fidelity": summary["by_broker"]["Fidelity"]}
+    assert delta["total_value"] == summary["total_value"]
+    assert delta["version"] == tracker.summary_version
+
+def test_malformed_rows_are_reported_not_fatal(tracker, mock_sheets_data):
+    """Test bad cells and invalid values are collected in the load report instead of aborting the load"""
+    mock_sheets_data["webull"] = [
+        ["MSFT", "15", "280.00"],
+        ["TSLA", "abc", "900.00"],   # Unparseable quantity
+        ["NVDA", "0", "400.00"],     # Zero quantity
+        [],                          # Blank row, ignored
+        ["AMD", "2"],                # Missing cost basis
+        ["SPY", "1,000", "$4,500.00"],  # Formatted numbers are fine
+    ]
+
+    tracker.load_positions()
+
+    webull = {p.symbol: p for p in tracker.positions if p.broker == BrokerSheet.WEBULL}
+    assert set(webull) == {"MSFT", "SPY"}
+    assert webull["SPY"].quantity == 1000 and webull["SPY"].cost_basis == 4500.00
+
+    report = next(r for r in tracker.load_report() if r["broker"] == "Webull")
+    assert report["rows"] == 5 and report["loaded"] == 2
+    # Webull!A2:C starts at sheet row 2
+    assert [(e["row"], e["error"]) for e in report["errors"]] == [
+        (3, "Invalid quantity: 'abc'"),
+        (4, "Quantity must be positive"),
+        (6, "Expected at least 3 columns, got 2"),
+    ]
@@ -0,0 +1,97 @@
+import pytest
+import asyncio
+import httpx
+import numpy as np
+from unittest.mock import Mock, patch
+from src.backend.utils.market_data import MarketDataService
+from src.backend.utils.async_market_data import AsyncMarketDataService
+from src.backend.utils.price_history import PriceHistory
+
+DAY = 86400
+
+@pytest.fixture
+def history(tmp_path):
+    return PriceHistory(str(tmp_path))
+
+def chart_response(timestamps, closes):
+    response = Mock()
+    response.json.return_value = {"chart": {"result": [{
+        "meta": {"dataGranularity": "1d"},
+        "timestamp": timestamps,
+        "indicators": {"quote": [{"close": closes}]},
+    }]}}
+    return response
+
+def test_merge_appends_and_replaces_forming_bar(history):
+    """Test merging only adds newer bars and overwrites bars from the first incoming one on"""
+    assert history.merge("AAPL", [0, DAY, 2 * DAY], [10.0, 11.0, 12.0]) == 3
+    # Re-fetch from the last stored bar: it gets its final close, and one new bar arrives
+    assert history.merge("AAPL", [2 * DAY, 3 * DAY], [12.5, 13.0]) == 1
+
+    bars = history.load("AAPL")
+    assert bars["close"].tolist() == [10.0, 11.0, 12.5, 13.0]
+    assert history.last_timestamp("AAPL") == 3 * DAY
+
+def test_range_and_aligned_queries(history):
+    """Test range slicing and forward-filled alignment across symbols"""
+    history.merge("BTC-USD", [0, DAY, 2 * DAY, 3 * DAY], [1.0, 2.0, 3.0, 4.0])
+    history.merge("AAPL", [DAY, 3 * DAY], [10.0, 30.0])
+
+    assert history.range("BTC-USD", start=DAY, end=2 * DAY)["close"].tolist() == [2.0, 3.0]
+
+    timeline, closes = history.aligned(["BTC-USD", "AAPL"])
+    assert timeline.astype("int64").tolist() == [0, DAY, 2 * DAY, 3 * DAY]
+    np.testing.assert_array_equal(closes[:, 0], [1.0, 2.0, 3.0, 4.0])
+    np.testing.assert_array_equal(closes[:, 1], [np.nan, 10.0, 10.0, 30.0])
+
+def test_backfill_fetches_only_newer_bars(tmp_path):
+    """Test the first backfill covers the lookback and later ones start at the last stored bar"""
+    with patch('src.backend.utils.market_data.settings.price_history_dir', str(tmp_path)):
+        service = MarketDataService()
+        service.session.get = Mock(return_value=chart_response([0, DAY], [10.0, 11.0]))
+        assert service.backfill_history("AAPL") == 2
+        first_params = service.session.get.call_args.kwargs["params"]
+
+        service._history_checked.clear()
+        service.session.get.return_value = chart_response([DAY, 2 * DAY], [11.5, 12.0])
+        assert service.backfill_history("AAPL") == 1
+        second_params = service.session.get.call_args.kwargs["params"]
+
+        # A second call within the same bar doesn't go back to the provider
+        assert service.backfill_history("AAPL") == 0
+        assert service.session.get.call_count == 2
+
+    assert first_params["period1"] == pytest.approx(first_params["period2"] - 1825 * DAY, abs=5)
+    assert second_params["period1"] == DAY
+    assert service.history.load("AAPL")["close"].tolist() == [10.0, 11.5, 12.0]
+
+def test_history_error_does_not_fail_price_lookup(tmp_path):
+    """Test a corrupt history file is logged and the lookup still returns Yahoo's price"""
+    (tmp_path / "AAPL.1d.npy").write_bytes(b"not a numpy file")
+    with patch('src.backend.utils.market_data.settings.price_history_dir', str(tmp_path)):
+        service = MarketDataService()
+        service.session.get = Mock(return_value=chart_response([0, DAY], [10.0, 11.0]))
+        assert service._fetch_price("AAPL") == (11.0, "yahoo")
+
+    health = service.provider_health()["yahoo"]
+    assert health["total_failures"] == 0
+    assert health["hit_rate"] == 1.0
+
+def test_async_lookup_extends_stored_history(tmp_path):
+    """Test the async Yahoo lookup folds its bars into a series that is already stored"""
+    def handler(request):
+        return httpx.Response(200, json=chart_response([DAY, 2 * DAY], [11.5, 12.0]).json())
+
+    with patch('src.backend.utils.market_data.settings.price_history_dir', str(tmp_path)):
+        service = AsyncMarketDataService(MarketDataService(), transport=httpx.MockTransport(handler))
+        service.market_data.history.merge("AAPL", [0, DAY], [10.0, 11.0])
+
+        async def scenario():
+            try:
+                return await service._try_yahoo_query_api("AAPL")
+            finally:
+                await service.aclose()
+
+        assert asyncio.run(scenario()) == 12.0
+
+    assert service.market_data.history.load("AAPL")["close"].tolist() == [10.0, 11.5, 12.0]
@@ -0,0 +1,209 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, AsyncMock
+from src.backend.api.portfolio_tracker import Position, BrokerSheet
+from src.backend.api.price_refresher import PriceRefresher
+from src.backend.api.price_stream import portfolio_events
+from src.backend.api.summary_payload import SummaryPayload
+from src.backend.utils.broadcaster import Broadcaster
+
+@pytest.fixture
+def tracker():
+    """Tracker stand-in holding one large and two small positions"""
+    tracker = Mock()
+    tracker.positions = [
+        Position(broker=BrokerSheet.WEBULL, symbol="NVDA", quantity=100, cost_basis=500.00),
+        Position(broker=BrokerSheet.WEBULL, symbol="F", quantity=10, cost_basis=10.00),
+        Position(broker=BrokerSheet.KRAKEN, symbol="DOGE", quantity=100, cost_basis=0.10),
+    ]
+    tracker.async_market_data.get_multiple_prices = AsyncMock(
+        side_effect=lambda symbols: {s: 1.0 for s in symbols})
+    tracker.get_summary.side_effect = lambda: {"total_value": 1.0}
+    return tracker
+
+def test_prioritize_prefers_large_positions(tracker):
+    """Test never-refreshed symbols are ordered by their share of portfolio value"""
+    refresher = PriceRefresher(tracker, interval=60, budget=2)
+    assert refresher.prioritize(now=0) == ["NVDA", "F"]
+
+def test_budget_rotates_through_small_positions(tracker):
+    """Test small positions still get refreshed once large ones are fresh"""
+    refresher = PriceRefresher(tracker, interval=60, budget=1)
+
+    asyncio.run(refresher.refresh_once())
+    asyncio.run(refresher.refresh_once())
+    asyncio.run(refresher.refresh_once())
+
+    refreshed = [call.args[0] for call in tracker.async_market_data.get_multiple_prices.call_args_list]
+    assert refreshed == [["NVDA"], ["F"], ["DOGE"]]
+
+def test_refresh_publishes_new_snapshot(tracker):
+    """Test each refresh publishes a new, versioned snapshot"""
+    refresher = PriceRefresher(tracker, interval=60)
+    assert refresher.snapshot is None
+
+    first = asyncio.run(refresher.refresh_once())
+    second = asyncio.run(refresher.refresh_once(full=True))
+
+    assert refresher.snapshot is second
+    assert second.version == first.version + 1
+    assert first.summary is not second.summary
+    tracker.apply_prices.assert_called_with({"NVDA": 1.0, "F": 1.0, "DOGE": 1.0})
+
+def test_background_loop_start_stop(tracker):
+    """Test the refresher runs in the background until stopped"""
+    refresher = PriceRefresher(tracker, interval=0.01)
+
+    async def scenario():
+        refresher.start()
+        await asyncio.sleep(0.05)
+        await refresher.stop()
+
+    asyncio.run(scenario())
+    assert refresher.snapshot is not None
+    assert refresher.snapshot.version >= 2
+
+def test_concurrent_refreshes_share_one_flight(tracker):
+    """Test concurrent full refreshes join the one in flight instead of each fetching prices"""
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_prices(symbols):
+        started.set()
+        await release.wait()
+        return {s: 1.0 for s in symbols}
+
+    tracker.async_market_data.get_multiple_prices = AsyncMock(side_effect=slow_prices)
+    refresher = PriceRefresher(tracker, interval=60)
+
+    async def scenario():
+        calls = [asyncio.ensure_future(refresher.refresh_once(full=True)) for _ in range(10)]
+        await started.wait()
+        # A budgeted cycle requested mid-refresh joins the full one too
+        calls.append(asyncio.ensure_future(refresher.refresh_once()))
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(*calls)
+
+    snapshots = asyncio.run(scenario())
+    assert tracker.async_market_data.get_multiple_prices.await_count == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+
+def test_concurrent_reloads_load_positions_once(tracker):
+    """Test concurrent reloads read the sheet once"""
+    refresher = PriceRefresher(tracker, interval=60)
+
+    async def scenario():
+        return await asyncio.gather(*(refresher.reload() for _ in range(5)))
+
+    snapshots = asyncio.run(scenario())
+    tracker.load_positions.assert_called_once()
+    assert len({snapshot.version for snapshot in snapshots}) == 1
+
+def test_reload_does_not_join_refresh_started_before_load(tracker):
+    """Test positions added by a reload are priced even while an older full refresh is in flight"""
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_prices(symbols):
+        started.set()
+        await release.wait()
+        return {s: 1.0 for s in symbols}
+
+    def load_positions():
+        tracker.positions = tracker.positions + [
+            Position(broker=BrokerSheet.WEBULL, symbol="NEW", quantity=1, cost_basis=1.00)]
+        return True
+
+    tracker.async_market_data.get_multiple_prices = AsyncMock(side_effect=slow_prices)
+    tracker.load_positions.side_effect = load_positions
+    refresher = PriceRefresher(tracker, interval=60)
+
+    async def scenario():
+        refresh = asyncio.ensure_future(refresher.refresh_once(full=True))
+        await started.wait()
+        reload = asyncio.ensure_future(refresher.reload())
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(refresh, reload)
+
+    first, reloaded = asyncio.run(scenario())
+    refreshed = [call.args[0] for call in tracker.async_market_data.get_multiple_prices.call_args_list]
+    assert refreshed == [["NVDA", "F", "DOGE"], ["NVDA", "F", "DOGE", "NEW"]]
+    assert reloaded.version > first.version
+
+def test_stream_sends_snapshot_then_deltas(tracker):
+    """Test a stream client gets the published summary, then a delta per price change"""
+    tracker.get_summary_payload.return_value = SummaryPayload(version=1, body=b'{"total_value":1.0}', etag='"v1"')
+    tracker.apply_prices.return_value = {"NVDA"}
+    tracker.summary_delta.side_effect = lambda changed: {"version": 2, "positions": {s: {} for s in changed}}
+    refresher = PriceRefresher(tracker, interval=60)
+
+    async def scenario():
+        await refresher.refresh_once(full=True)
+        events = portfolio_events(refresher, keepalive=60)
+        snapshot = await events.__anext__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        await refresher.refresh_once(full=True)
+        delta = await next_event
+        await events.aclose()
+        return snapshot, delta
+
+    snapshot, delta = asyncio.run(scenario())
+    assert snapshot == 'event: snapshot\nid: 1\ndata: {"total_value":1.0}\n\n'
+    assert delta == 'event: delta\nid: 2\ndata: {"version":2,"positions":{"NVDA":{}}}\n\n'
+    assert len(refresher.updates) == 0
+
+def test_broadcaster_resyncs_slow_subscribers():
+    """Test a subscriber that falls a full queue behind gets a resync marker instead of a backlog"""
+    async def scenario():
+        broadcaster = Broadcaster(queue_size=2)
+        queue = broadcaster.subscribe()
+        for version in range(3):
+            broadcaster.publish({"version": version})
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert asyncio.run(scenario()) == [None]
+
+def test_registry_evicts_least_recently_used(monkeypatch):
+    """Test the registry keeps at most max_portfolios trackers, closing the least recently used"""
+    from src.backend.api import portfolio_registry
+    monkeypatch.setattr(portfolio_registry.settings, "background_refresh", False)
+    monkeypatch.setattr(portfolio_registry, "PortfolioTracker", lambda market_data, sheet_id: Mock(sheet_id=sheet_id))
+    market_data = Mock()
+    registry = portfolio_registry.PortfolioRegistry(market_data, max_portfolios=2, allowed_sheet_ids=["a", "b", "c"])
+
+    async def scenario():
+        first = await registry.get("a")
+        await registry.get("b")
+        assert await registry.get("a") is first
+        await registry.get("c")
+
+    asyncio.run(scenario())
+    assert registry.sheet_ids() == ["a", "c"]
+    with pytest.raises(portfolio_registry.PortfolioNotAllowed):
+        asyncio.run(registry.get("d"))
+
+def test_evicted_portfolio_ends_its_streams(tracker, monkeypatch):
+    """Test evicting a streamed portfolio ends its SSE streams so clients reconnect"""
+    from src.backend.api import portfolio_registry
+    monkeypatch.setattr(portfolio_registry.settings, "background_refresh", False)
+    monkeypatch.setattr(portfolio_registry, "PortfolioTracker", lambda market_data, sheet_id: Mock(sheet_id=sheet_id))
+    tracker.get_summary_payload.return_value = SummaryPayload(version=1, body=b'{"total_value":1.0}', etag='"v1"')
+    tracker.apply_prices.return_value = set()
+    registry = portfolio_registry.PortfolioRegistry(Mock(), max_portfolios=1, allowed_sheet_ids=["a", "b"])
+    refresher = PriceRefresher(tracker, interval=60)
+    registry._refreshers["a"] = refresher
+
+    async def scenario():
+        await refresher.refresh_once(full=True)
+        events = portfolio_events(refresher, keepalive=60)
+        await events.__anext__()
+        next_event = asyncio.ensure_future(events.__anext__())
+        await registry.get("b")
+        with pytest.raises(StopAsyncIteration):
+            await next_event
+
+    asyncio.run(scenario())
+    assert registry.sheet_ids() == ["b"]
+    assert len(refresher.updates) == 0
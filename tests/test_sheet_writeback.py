@@ -0,0 +1,94 @@
+import pytest
+import asyncio
+from unittest.mock import Mock
+from src.backend.api.portfolio_tracker import Position, BrokerSheet
+from src.backend.api.sheet_writeback import SheetWriteback
+
+@pytest.fixture
+def tracker():
+    """Tracker stand-in with positions loaded from Webull rows 2-3 and Fidelity row 2"""
+    tracker = Mock()
+    tracker.positions = (
+        Position.from_rows(BrokerSheet.WEBULL, [["AAPL", "10", "150"], ["MSFT", "5", "250"]])
+        + Position.from_rows(BrokerSheet.FIDELITY, [["Roth IRA", "AAPL", "2", "100"]])
+    )
+    return tracker
+
+def set_price(tracker, symbol, price):
+    for position in tracker.positions:
+        if position.symbol == symbol:
+            position.current_value = price
+
+def test_flush_writes_changed_cells_in_one_batch(tracker):
+    """Test one batchUpdate carries every changed cell and unchanged cells are not rewritten"""
+    writeback = SheetWriteback(tracker, debounce=0)
+    set_price(tracker, "AAPL", 160.0)
+    set_price(tracker, "MSFT", 300.0)
+
+    assert asyncio.run(writeback.flush()) == 6
+    tracker.sheets_client.batch_update.assert_called_once()
+    data = {entry["range"]: entry["values"] for entry in tracker.sheets_client.batch_update.call_args.args[0]}
+    assert data["Webull!D2"] == [[1600.0]]
+    assert data["Webull!E2"] == [[100.0]]
+    assert data["Fidelity!E2"] == [[320.0]]
+    assert data["Fidelity!F2"] == [[120.0]]
+
+    # Only MSFT moved, so only its two cells go out
+    set_price(tracker, "MSFT", 310.0)
+    assert asyncio.run(writeback.flush()) == 2
+    data = {entry["range"] for entry in tracker.sheets_client.batch_update.call_args.args[0]}
+    assert data == {"Webull!D3", "Webull!E3"}
+
+    assert asyncio.run(writeback.flush()) == 0
+    assert tracker.sheets_client.batch_update.call_count == 2
+
+def test_schedule_debounces_refreshes(tracker):
+    """Test several refreshes inside the debounce window produce a single write"""
+    writeback = SheetWriteback(tracker, debounce=0.05)
+
+    async def scenario():
+        for price in (150.0, 155.0, 160.0):
+            set_price(tracker, "AAPL", price)
+            writeback.schedule()
+            await asyncio.sleep(0.01)
+        await writeback._task
+
+    asyncio.run(scenario())
+    tracker.sheets_client.batch_update.assert_called_once()
+    data = {entry["range"]: entry["values"] for entry in tracker.sheets_client.batch_update.call_args.args[0]}
+    assert data["Webull!D2"] == [[1600.0]]
+    # Unpriced positions leave their cells alone
+    assert "Webull!D3" not in data
+
+def test_failed_flush_is_retried_without_new_refreshes(tracker, monkeypatch):
+    """Test a failed write is retried with backoff even when no further price change schedules one"""
+    from src.backend.api import sheet_writeback
+    monkeypatch.setattr(sheet_writeback.settings, "writeback_retry_max", 0.02)
+    tracker.sheets_client.batch_update.side_effect = [Exception("quota exceeded"), None]
+    writeback = SheetWriteback(tracker, debounce=0.01)
+    set_price(tracker, "AAPL", 160.0)
+
+    async def scenario():
+        writeback.schedule()
+        await asyncio.wait_for(writeback._task, timeout=1)
+
+    asyncio.run(scenario())
+    assert tracker.sheets_client.batch_update.call_count == 2
+    assert asyncio.run(writeback.flush()) == 0
+
+def test_writeback_columns_follow_settings(tracker, monkeypatch):
+    """Test write-back columns can be moved (or turned off) per broker through settings"""
+    from src.backend.api import broker_schema
+    monkeypatch.setattr(broker_schema.settings, "webull_writeback_columns", "H, J")
+    monkeypatch.setattr(broker_schema.settings, "fidelity_writeback_columns", "")
+    set_price(tracker, "AAPL", 160.0)
+
+    cells = SheetWriteback(tracker, debounce=0).cells()
+    assert cells == {"Webull!H2": 1600.0, "Webull!J2": 100.0}
+
+def test_writeback_columns_must_not_overlap_read_range(tracker, monkeypatch):
+    """Test a write-back column inside the read range is rejected, since writes would force reloads"""
+    from src.backend.api import broker_schema
+    monkeypatch.setattr(broker_schema.settings, "webull_range", "Webull!A2:F")
+    with pytest.raises(ValueError, match="inside the read range"):
+        SheetWriteback(tracker)